@@ -3,6 +3,9 @@ import datetime
 
 
 class Block:
+    # __slots__ instead of a per-object __dict__ keeps every block a fixed-size record
+    __slots__ = ('index', 'previous_hash', 'timestamp', 'data', 'hash')
+
     def __init__(self, index, previous_hash, timestamp, data, hash):
         self.index = index
         self.previous_hash = previous_hash
@@ -10,6 +13,21 @@ class Block:
         self.data = data
         self.hash = hash
 
+    # Convert the block into a plain dict (the timestamp as an ISO 8601 string) and back
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'previous_hash': self.previous_hash,
+            'timestamp': self.timestamp.isoformat(),
+            'data': self.data,
+            'hash': self.hash,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['index'], data['previous_hash'], datetime.datetime.fromisoformat(data['timestamp']),
+                   data['data'], data['hash'])
+
     # Convert string value of self.data into byte format [sha256 requires bytes]
     # sha256 - generate hash from self.data in byte format
     # hexdigest() - convert hash into string representation
@@ -1,17 +1,25 @@
 import hashlib
 
 
+# The target is a 256-bit integer: a nonce is valid when the SHA-256 digest, read as a big-endian
+# number, is not above it. Comparing the raw digest bytes with the target's 32 bytes gives the same order
+def target_from_zero_bits(bits):
+    return (1 << (256 - bits)) - 1
+
+
 def proof_of_work(block, target):
+    target_bytes = target.to_bytes(32, 'big')
+    prefix = hashlib.sha256(f'{block}'.encode())
     nonce = 0
     while True:
-        data = f'{block}{nonce}'.encode()
-        hash_result = hashlib.sha256(data).hexdigest()
-        if hash_result[:len(target)] == target:
+        guess = prefix.copy()
+        guess.update(str(nonce).encode())
+        if guess.digest() <= target_bytes:
             return nonce
         nonce += 1
 
 
 block_data = "Transaction data"
-target_prefix = "0000"
-nonce = proof_of_work(block_data, target_prefix)
+target = target_from_zero_bits(16)  # same as the "0000" hex prefix
+nonce = proof_of_work(block_data, target)
 print(f"Valid nonce found: {nonce}")
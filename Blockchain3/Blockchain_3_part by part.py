@@ -1,5 +1,4 @@
 import hashlib
-import json
 from time import time
 from urllib.parse import urlparse
 from uuid import uuid4
@@ -8,6 +7,10 @@ from flask import Flask, jsonify, request
 
 from argparse import ArgumentParser
 
+from block_header import HEADER_VERSION, encode_header, merkle_root
+from difficulty import DEFAULT_TARGET, meets_target, proof_digest
+from mining import search_sequential
+
 
 class Blockchain:
     def __init__(self):
@@ -20,9 +23,11 @@ class Blockchain:
     def new_block(self, proof, previous_hash=None):
         # Create a new block in the blockchain
         block = {
+            'version': HEADER_VERSION,
             'index': len(self.chain) + 1,
             'timestamp': time(),
             'transactions': self.current_transactions,
+            'merkle_root': merkle_root(self.current_transactions).hex(),
             'proof': proof,
             'previous_hash': previous_hash or self.hash(self.chain[-1]),
         }
@@ -46,23 +51,20 @@ class Blockchain:
 
     @staticmethod
     def hash(block):
-        # Hash a block
-        block_string = json.dumps(block, sort_keys=True).encode()
-        return hashlib.sha256(block_string).hexdigest()
+        # Hash a block: only its fixed-size binary header, which commits to the transactions via the Merkle root
+        header = encode_header(block['index'], block['timestamp'], block['previous_hash'], block['merkle_root'],
+                               block['proof'])
+        return hashlib.sha256(header).hexdigest()
 
     def proof_of_work(self, last_proof):
         # Find a number p' such that hash(pp') contains leading 4 zeroes, where p is the previous p'
-        proof = 0
-        while self.valid_proof(last_proof, proof) is False:
-            proof += 1
-        return proof
+        # The hash of p is computed once and reused for every candidate p'
+        return search_sequential(last_proof)
 
     @staticmethod
-    def valid_proof(last_proof, proof):
-        # Check if the hash of the proof contains 4 leading zeroes
-        guess = f'{last_proof}{proof}'.encode()
-        guess_hash = hashlib.sha256(guess).hexdigest()
-        return guess_hash[:4] == "0000"
+    def valid_proof(last_proof, proof, target=DEFAULT_TARGET):
+        # Check if the hash of the proof is below the target (by default: 16 leading zero bits, i.e. "0000")
+        return meets_target(proof_digest(last_proof, proof), target)
 
 
 app = Flask(__name__)
@@ -114,6 +116,38 @@ def full_chain():
     return jsonify(response), 200
 
 
+@app.route('/chain/tip', methods=['GET'])
+def chain_tip():
+    # Return only the chain height and the hash of the last block
+    response = {
+        'length': len(blockchain.chain),
+        'hash': blockchain.hash(blockchain.last_block),
+    }
+    return jsonify(response), 200
+
+
+@app.route('/chain/blocks', methods=['GET'])
+def chain_blocks():
+    # Return up to 'limit' blocks starting at block index 'start', or right after the block with hash 'after'
+    after = request.args.get('after')
+    if after is not None:
+        # Every block stores the hash of the block before it
+        start = next((block['index'] for block in blockchain.chain if block['previous_hash'] == after), None)
+        if start is None and after == blockchain.hash(blockchain.last_block):
+            start = len(blockchain.chain) + 1
+        if start is None:
+            return 'Unknown block hash', 404
+    else:
+        start = max(request.args.get('start', 1, type=int), 1)
+    limit = max(1, min(request.args.get('limit', 500, type=int), 500))
+    response = {
+        'blocks': blockchain.chain[start - 1:start - 1 + limit],
+        'start': start,
+        'length': len(blockchain.chain),
+    }
+    return jsonify(response), 200
+
+
 if __name__ == '__main__':
     print(f"Your wallet address (node identifier): {node_identifier}")
     parser = ArgumentParser()
@@ -0,0 +1,70 @@
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+from BLOCKCHAIN3 import Blockchain
+
+TRANSACTIONS_PER_BLOCK = 1000
+
+
+# The previous get_balance: scan every transaction of every block
+def scan_balance(chain, wallet_address):
+    balance = 0
+    for block in chain:
+        for transaction in block['transactions']:
+            if transaction['sender'] == wallet_address:
+                balance -= transaction['amount']
+            if transaction['recipient'] == wallet_address:
+                balance += transaction['amount']
+    return balance
+
+
+# Build a chain holding the given number of random transfers between the given addresses
+# Blocks are appended directly (no proof of work, no signatures) since only the balances are measured
+def build_chain(transactions, addresses):
+    blockchain = Blockchain()
+    for start in range(0, transactions, TRANSACTIONS_PER_BLOCK):
+        blockchain.current_transactions = [
+            {
+                'sender': random.choice(addresses),
+                'recipient': random.choice(addresses),
+                'amount': random.randint(1, 100),
+                'signature': None,
+            }
+            for _ in range(min(TRANSACTIONS_PER_BLOCK, transactions - start))
+        ]
+        blockchain.new_block(0)
+    return blockchain
+
+
+# Time `queries` balance lookups with the full scan and with the index; both must agree
+def bench_balances(transactions, queries, addresses):
+    blockchain = build_chain(transactions, addresses)
+    wanted = random.sample(addresses, queries)
+
+    start = perf_counter()
+    scanned = [scan_balance(blockchain.chain, address) for address in wanted]
+    scan_time = (perf_counter() - start) / queries
+
+    start = perf_counter()
+    indexed = [blockchain.get_balance(address) for address in wanted]
+    index_time = (perf_counter() - start) / queries
+
+    if scanned != indexed:
+        raise AssertionError('indexed balances differ from the full scan')
+    return scan_time, index_time
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', default='100000,1000000', help='comma separated transaction counts')
+    parser.add_argument('-q', '--queries', default=5, type=int, help='balance lookups per size')
+    parser.add_argument('--addresses', default=1000, type=int, help='number of distinct wallet addresses')
+    args = parser.parse_args()
+
+    addresses = [f'wallet-{i}' for i in range(args.addresses)]
+
+    print(f"{'transactions':>12} {'full scan':>12} {'indexed':>12} {'speedup':>10}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        scan_time, index_time = bench_balances(size, args.queries, addresses)
+        print(f"{size:>12} {scan_time * 1e3:>10.2f}ms {index_time * 1e6:>10.2f}us {scan_time / index_time:>9.0f}x")
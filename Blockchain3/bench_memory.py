@@ -0,0 +1,36 @@
+import json
+import tracemalloc
+from argparse import ArgumentParser
+
+from block_store import compact_block
+from signatures import generate_keys
+
+
+# Bytes allocated per block while parsing the JSON records of a chain, optionally compacted
+def bytes_per_block(records, compact):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    blocks = [compact_block(json.loads(record)) if compact else json.loads(record) for record in records]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(blocks)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-b', '--blocks', default=2000, type=int, help='blocks in the chain')
+    parser.add_argument('-t', '--transactions', default=10, type=int, help='transactions per block')
+    parser.add_argument('-s', '--senders', default=20, type=int, help='number of distinct senders')
+    args = parser.parse_args()
+
+    # Legacy senders are full PEM public keys; registered senders use their 40-character key id
+    pems = [generate_keys()[1] for _ in range(args.senders)]
+    for name, senders in (('PEM senders', pems), ('key id senders', [f'{i:040x}' for i in range(args.senders)])):
+        records = [json.dumps({
+            'index': b,
+            'transactions': [{'sender': senders[(b + i) % len(senders)], 'recipient': senders[i % len(senders)],
+                              'amount': i, 'signature': f'{b:08x}{i:0248x}'} for i in range(args.transactions)],
+        }).encode() for b in range(args.blocks)]
+        plain = bytes_per_block(records, compact=False)
+        compact = bytes_per_block(records, compact=True)
+        print(f"{name:<15} {plain:>10.0f} -> {compact:>8.0f} bytes per block")
@@ -0,0 +1,74 @@
+import hashlib
+import os
+from argparse import ArgumentParser
+from time import perf_counter
+
+from mining import ParallelMiner, search_sequential
+
+
+# The original loop: rebuild, encode and hash the whole guess and compare the hex digest for every nonce
+def legacy_proof_of_work(last_pow):
+    pow = 0
+    while hashlib.sha256(f'{last_pow}{pow}'.encode()).hexdigest()[:4] != "0000":
+        pow += 1
+    return pow
+
+
+# Compare the hash rate of the legacy loop with the midstate-reusing loop on a single thread
+# Both loops must agree on every proof
+def bench_hash_loops(last_pows):
+    results = {}
+    for name, loop in (('legacy', legacy_proof_of_work), ('midstate', search_sequential)):
+        loop(last_pows[0])
+        start = perf_counter()
+        proofs = [loop(last_pow) for last_pow in last_pows]
+        elapsed = perf_counter() - start
+        results[name] = (proofs, sum(proof + 1 for proof in proofs) / elapsed)
+
+    if results['legacy'][0] != results['midstate'][0]:
+        raise AssertionError('midstate loop produced different proofs than the legacy loop')
+    return results['legacy'][1], results['midstate'][1]
+
+
+# Mine a proof for each of the given last proofs and report the effective hash rate
+# The work done is counted as the number of nonces the sequential loop would have tried (proof + 1),
+# so the rates of different worker counts are directly comparable
+def bench_workers(workers, last_pows):
+    miner = ParallelMiner(workers=workers)
+    try:
+        # Warm up: start the pool before timing
+        miner.search(last_pows[0])
+
+        start = perf_counter()
+        hashes = sum(miner.search(last_pow) + 1 for last_pow in last_pows)
+        elapsed = perf_counter() - start
+    finally:
+        miner.close()
+    return hashes, elapsed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--blocks', default=20, type=int, help='number of proofs to mine per run')
+    parser.add_argument('--max-workers', default=os.cpu_count(), type=int, help='largest worker count to try')
+    args = parser.parse_args()
+
+    last_pows = list(range(100, 100 + args.blocks))
+
+    legacy_rate, midstate_rate = bench_hash_loops(last_pows)
+    print(f"legacy loop:   {legacy_rate:>12.0f} hashes/s")
+    print(f"midstate loop: {midstate_rate:>12.0f} hashes/s ({midstate_rate / legacy_rate:.2f}x)\n")
+
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= args.max_workers:
+        worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != args.max_workers:
+        worker_counts.append(args.max_workers)
+
+    baseline = None
+    print(f"{'workers':>8} {'hashes':>10} {'seconds':>8} {'hashes/s':>12} {'speedup':>8}")
+    for workers in worker_counts:
+        hashes, elapsed = bench_workers(workers, last_pows)
+        rate = hashes / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>8} {hashes:>10} {elapsed:>8.3f} {rate:>12.0f} {rate / baseline:>7.2f}x")
@@ -0,0 +1,109 @@
+import json
+import threading
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+from urllib.parse import parse_qs, urlparse
+
+from BLOCKCHAIN3 import MAX_BLOCKS_PER_PAGE, Blockchain
+
+
+# Start a local stand-in peer serving the sync routes of the given blockchain after a fixed delay
+# The number of response bytes sent is counted in server.bytes_sent
+# Return the server; its address is server.server_address
+def start_peer(blockchain, delay):
+    class PeerHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            sleep(delay)
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+            if url.path == '/chain':
+                payload = {'chain': blockchain.chain, 'length': len(blockchain.chain)}
+            elif url.path == '/chain/tip':
+                payload = {'length': len(blockchain.chain), 'work': blockchain.work, 'hash': blockchain.verified_hash}
+            elif url.path == '/chain/blocks':
+                if 'after' in query:
+                    start = blockchain.index_after(query['after'])
+                else:
+                    start = int(query.get('start', 1))
+                if start is None:
+                    return self.reply(404, b'Unknown block hash')
+                blocks = blockchain.blocks_from(start, MAX_BLOCKS_PER_PAGE)
+                payload = {'blocks': blocks, 'start': start, 'length': len(blockchain.chain)}
+            else:
+                return self.reply(404, b'Not found')
+
+            self.reply(200, json.dumps(payload).encode())
+
+        def reply(self, status, body):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            with lock:
+                server.bytes_sent += len(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    lock = threading.Lock()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PeerHandler)
+    server.bytes_sent = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Build a chain of the given length, starting from a copy of the given chain if one is passed
+def build_chain(length, base=None):
+    blockchain = Blockchain()
+    if base is not None:
+        blockchain.replace_chain(json.loads(json.dumps(base)))
+    while len(blockchain.chain) < length:
+        blockchain.new_block(blockchain.proof_of_work(blockchain.last_block['pow']))
+    return blockchain
+
+
+# Let node resolve against the given peers and report time and bytes received
+def run_resolve(title, node, peers, delays):
+    for peer in peers:
+        host, port = peer.server_address
+        node.register_node(f'http://{host}:{port}')
+        peer.bytes_sent = 0
+
+    start = perf_counter()
+    replaced = node.resolve_conflicts()
+    elapsed = perf_counter() - start
+
+    print(title)
+    print(f"  peers: {len(peers)}, chain replaced: {replaced}, length: {len(node.chain)}")
+    print(f"  sum of peer delays:  {sum(delays):.2f}s")
+    print(f"  slowest peer delay:  {max(delays):.2f}s")
+    print(f"  resolve_conflicts:   {elapsed:.2f}s")
+    print(f"  bytes received:      {sum(peer.bytes_sent for peer in peers)}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--peers', default=20, type=int, help='number of stand-in peers')
+    parser.add_argument('--delay', default=0.2, type=float, help='response delay of each peer in seconds')
+    parser.add_argument('--slow-delay', default=1.0, type=float, help='response delay of the slowest peer')
+    parser.add_argument('--blocks', default=20, type=int, help='length of the chain the node starts with')
+    args = parser.parse_args()
+
+    local = build_chain(args.blocks)
+    ahead = build_chain(args.blocks + 2, base=local.chain)
+    delays = [args.delay] * (args.peers - 1) + [args.slow_delay]
+
+    # Every peer holds the node's chain plus two more blocks: only the two missing blocks are transferred
+    peers = [start_peer(ahead, delay) for delay in delays]
+    node = build_chain(args.blocks, base=local.chain)
+    node.peer_timeout = args.slow_delay + 5
+    run_resolve('peers two blocks ahead', node, peers, delays)
+
+    # The node is now in sync with every peer: only the chain tips are transferred
+    run_resolve('peers in sync', node, peers, delays)
+
+    for peer in peers:
+        peer.shutdown()
@@ -0,0 +1,51 @@
+import json
+from argparse import ArgumentParser
+from time import perf_counter
+
+from BLOCKCHAIN3 import Blockchain
+import signatures
+
+
+# Sign n transfers from one sender and return them as transaction dicts
+def signed_transactions(private_key_pem, sender, n):
+    transactions = []
+    for i in range(n):
+        data = f'{sender}recipient-{i}{i}'.encode()
+        transactions.append({
+            'sender': sender,
+            'recipient': f'recipient-{i}',
+            'amount': i,
+            'signature': signatures.sign(private_key_pem, data),
+        })
+    return transactions
+
+
+# Verifications per second of the given transactions on the blockchain (single thread)
+def verify_rate(blockchain, transactions):
+    start = perf_counter()
+    for t in transactions:
+        if not blockchain.verify_signature(t['sender'], t['recipient'], t['amount'], t['signature']):
+            raise AssertionError('a valid signature failed to verify')
+    return len(transactions) / (perf_counter() - start)
+
+
+# Average size in bytes of the transactions as JSON, as they are sent to the node and stored in blocks
+def payload_size(transactions):
+    return sum(len(json.dumps(t)) for t in transactions) / len(transactions)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--transactions', default=2000, type=int, help='transactions verified per scheme')
+    args = parser.parse_args()
+
+    blockchain = Blockchain()
+    print(f"{'scheme':<10} {'sender':<8} {'bytes/tx':>9} {'verify/s':>10}")
+    for name in signatures.SCHEMES:
+        private_key_pem, public_key_pem = signatures.generate_keys(name)
+        key_id = blockchain.register_key(public_key_pem)
+
+        for sender_name, sender in (('pem', public_key_pem), ('key id', key_id)):
+            transactions = signed_transactions(private_key_pem, sender, args.transactions)
+            print(f"{name:<10} {sender_name:<8} {payload_size(transactions):>9.0f} "
+                  f"{verify_rate(blockchain, transactions):>10.0f}")
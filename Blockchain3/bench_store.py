@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from time import perf_counter, time
+
+from BLOCKCHAIN3 import Blockchain
+from block_store import BlockStore
+
+
+# Write a chain of the given number of blocks (each holding one reward transaction) straight to a store
+# The blocks are linked by their hashes but carry no real proof of work; once indexed they are not re-validated
+def write_chain(directory, blocks):
+    store = BlockStore(directory, batch_size=1000)
+    block = {'index': 1, 'timestamp': time(), 'transactions': [], 'pow': 100, 'previous_hash': '1'}
+    store.append(block)
+    for index in range(2, blocks + 1):
+        block = {
+            'index': index,
+            'timestamp': time(),
+            'transactions': [{'sender': '0', 'recipient': f'miner-{index % 100}', 'amount': 1, 'signature': None}],
+            'pow': index,
+            'previous_hash': Blockchain.hash(block),
+        }
+        store.append(block)
+    store.close()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--blocks', default=100000, type=int, help='number of blocks in the stored chain')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        start = perf_counter()
+        write_chain(directory, args.blocks)
+        write_time = perf_counter() - start
+        size = os.path.getsize(os.path.join(directory, 'blocks.log'))
+
+        start = perf_counter()
+        blockchain = Blockchain(store=BlockStore(directory))
+        load_time = perf_counter() - start
+
+        print(f"blocks:        {len(blockchain.chain)}")
+        print(f"log size:      {size / 2 ** 20:.1f} MiB")
+        print(f"write (batched, fsync'd): {write_time:.2f}s")
+        print(f"restart (load + indexes): {load_time:.2f}s")
+        blockchain.store.close()
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import math
+import struct
+
+from difficulty import DEFAULT_TARGET, target_bytes
+
+# Blocks without a 'version' field are version 1: their hash is SHA-256 over the whole block as sorted JSON
+LEGACY_VERSION = 1
+
+# Version 2 blocks are hashed over a fixed-size binary header that commits to the transactions
+# through their Merkle root
+HEADER_VERSION = 2
+
+# version, index, timestamp, previous hash, Merkle root, target, proof of work: 121 bytes
+HEADER = struct.Struct('>BQd32s32s32sQ')
+
+# Merkle root of a block without transactions
+EMPTY_MERKLE_ROOT = bytes(32)
+
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+# Hash one transaction as sorted JSON, the same encoding version 1 blocks use for the whole block
+def transaction_digest(transaction):
+    return hashlib.sha256(json.dumps(transaction, sort_keys=True).encode()).digest()
+
+
+# Return the Merkle root (raw 32 bytes) of a list of transactions
+# Each level hashes the concatenated raw digests of neighbouring nodes; an odd last node is paired with itself
+def merkle_root(transactions):
+    if not transactions:
+        return EMPTY_MERKLE_ROOT
+
+    level = [transaction_digest(transaction) for transaction in transactions]
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0]
+
+
+# Pack the header fields into their canonical binary form
+# Hashes are given as hex strings; short ones such as the genesis previous hash "1" are zero-padded
+def encode_header(index, timestamp, previous_hash, merkle_root_hex, pow, target=DEFAULT_TARGET,
+                  version=HEADER_VERSION):
+    return HEADER.pack(
+        version,
+        index,
+        timestamp,
+        int(previous_hash, 16).to_bytes(32, 'big'),
+        bytes.fromhex(merkle_root_hex),
+        target_bytes(target),
+        pow,
+    )
+
+
+# Hash a block of a BLOCKCHAIN3 chain
+# Version 2 blocks hash their ~121-byte header; the Merkle root stored in the block must be checked
+# against its transactions separately (see is_valid_chain). Legacy blocks hash the full sorted JSON
+def hash_block(block):
+    if block.get('version', LEGACY_VERSION) == LEGACY_VERSION:
+        return hashlib.sha256(json.dumps(block, sort_keys=True).encode()).hexdigest()
+
+    header = encode_header(
+        block['index'], block['timestamp'], block['previous_hash'], block['merkle_root'], block['pow'],
+        block.get('target', DEFAULT_TARGET), block['version']
+    )
+    return hashlib.sha256(header).hexdigest()
+
+
+# Check that value is an int (not a bool) with 0 <= value < limit
+def _is_uint(value, limit):
+    return type(value) is int and 0 <= value < limit
+
+
+# Check that value is a lowercase hex string of at most length digits (exactly length if exact is set)
+def _is_hex(value, length, exact=False):
+    if not isinstance(value, str) or not value or len(value) > length or (exact and len(value) != length):
+        return False
+    return HEX_DIGITS.issuperset(value)
+
+
+# Check the types of every field that hashing, proof-of-work checks and retargeting read from a block
+# A block from a peer is untrusted JSON: a field of the wrong type must make it invalid instead of raising
+# while it is hashed. The genesis previous hash "1" is short, so hashes may have fewer than 64 digits
+def valid_block_fields(block):
+    if not isinstance(block, dict):
+        return False
+
+    transactions = block.get('transactions')
+    if not isinstance(transactions, list) or not all(isinstance(t, dict) for t in transactions):
+        return False
+
+    timestamp = block.get('timestamp')
+    if type(timestamp) not in (int, float) or not math.isfinite(timestamp):
+        return False
+
+    if not (_is_uint(block.get('index'), 1 << 64) and _is_uint(block.get('pow'), 1 << 64)
+            and _is_hex(block.get('previous_hash'), 64)):
+        return False
+
+    if 'target' in block and not (_is_uint(block['target'], 1 << 256) and block['target'] > 0):
+        return False
+
+    version = block.get('version', LEGACY_VERSION)
+    if version == LEGACY_VERSION and type(version) is int:
+        return True
+    return version == HEADER_VERSION and type(version) is int and _is_hex(block.get('merkle_root'), 64, exact=True)
+
+
+# Check that a block's stored Merkle root matches its transactions (always true for legacy blocks)
+def valid_merkle_root(block):
+    if block.get('version', LEGACY_VERSION) == LEGACY_VERSION:
+        return True
+    return block['merkle_root'] == merkle_root(block['transactions']).hex()
@@ -0,0 +1,229 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+# Every record in the block log is a 4-byte big-endian length followed by the block as JSON
+RECORD_HEADER = struct.Struct('>I')
+
+# The index file starts with a magic tag and the number of indexed blocks, followed by one
+# 8-byte log offset per block
+INDEX_MAGIC = b'BLK1'
+INDEX_HEADER = struct.Struct('>4sQ')
+
+# Flush buffered blocks once this many are waiting or the oldest has waited this many seconds
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+# Make the repeated strings of a block (addresses and document owners) share one string object each
+# Blocks stay plain dicts, since they are the JSON wire and storage format of the chain, but JSON parsing gives
+# every occurrence of a sender's address (a full PEM for legacy senders) its own copy; interning them keeps one
+def compact_block(block):
+    for transaction in block['transactions']:
+        for field in ('sender', 'recipient', 'owner'):
+            value = transaction.get(field)
+            if type(value) is str:
+                transaction[field] = sys.intern(value)
+    return block
+
+
+class BlockStore:
+    # Durable, append-only storage for the blocks of a chain, kept in the given directory
+    # blocks.log holds the blocks and blocks.idx the offset of each of them; appended blocks are buffered
+    # and written (and fsync'd) in batches of batch_size, or at the latest flush_interval seconds after
+    # the first of them was appended
+    def __init__(self, directory, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, 'blocks.log')
+        self.index_path = os.path.join(directory, 'blocks.idx')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.offsets = array('Q')
+        self.indexed = 0
+        self.log_end = 0
+        self.buffer = []
+        self.flush_timer = None
+        self.lock = threading.RLock()
+
+        self.log = open(self.log_path, 'a+b')
+        self.index = open(self.index_path, 'r+b' if os.path.exists(self.index_path) else 'w+b')
+
+    # Number of blocks in the store, including the ones not written yet
+    def __len__(self):
+        return len(self.offsets) + len(self.buffer)
+
+    # Read every block back from the log
+    # Return (blocks, indexed): indexed is how many leading blocks were recorded in the index by a completed
+    # flush and so were already validated; any blocks after them are complete records whose index update
+    # was lost and have to be validated again. A torn or unreadable record after them is cut off, together
+    # with everything behind it
+    # The indexed records are cut out of the log at the offsets the index holds, and the log is only scanned
+    # record by record from the end of the last indexed one; an index that does not fit the log is ignored
+    # and every block is then validated again
+    def load(self):
+        offsets = self._read_index()
+
+        blocks = []
+        self.offsets = array('Q')
+        position = 0
+        size = os.path.getsize(self.log_path)
+        if size:
+            with mmap.mmap(self.log.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                tail = self._indexed_end(data, size, offsets)
+                if tail is not None:
+                    starts = offsets.tolist()
+                    ends = starts[1:] + [tail]
+                    try:
+                        blocks = [compact_block(json.loads(data[start + RECORD_HEADER.size:end]))
+                                  for start, end in zip(starts, ends)]
+                        self.offsets = offsets
+                        position = tail
+                    except (ValueError, TypeError, KeyError):
+                        # An offset in the middle of the index does not point at a record
+                        blocks = []
+                        tail = None
+                if tail is None:
+                    offsets = array('Q')
+                indexed = len(offsets)
+
+                # A record whose body is not a block (e.g. zeros left by a crash) ends the log like a short one
+                while position + RECORD_HEADER.size <= size:
+                    (length,) = RECORD_HEADER.unpack_from(data, position)
+                    end = position + RECORD_HEADER.size + length
+                    if end > size:
+                        break
+                    try:
+                        block = compact_block(json.loads(data[position + RECORD_HEADER.size:end]))
+                    except (ValueError, TypeError, KeyError):
+                        break
+                    blocks.append(block)
+                    self.offsets.append(position)
+                    position = end
+        else:
+            indexed = 0
+
+        if position < size:
+            self.log.truncate(position)
+        self.log_end = position
+        self.indexed = indexed
+        return blocks, self.indexed
+
+    # Read the offsets of the indexed blocks from the index (none for a new or damaged index)
+    def _read_index(self):
+        offsets = array('Q')
+        self.index.seek(0)
+        header = self.index.read(INDEX_HEADER.size)
+        if len(header) < INDEX_HEADER.size:
+            return offsets
+        magic, count = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC:
+            return offsets
+        data = self.index.read(count * offsets.itemsize)
+        if len(data) != count * offsets.itemsize:
+            return offsets
+        offsets.frombytes(data)
+        return offsets
+
+    # Check the index offsets against the log and return where the last indexed record ends
+    # The offsets must start at 0 and leave room for a record header between each other, and the last record
+    # must fit in the log; otherwise None is returned and the whole log is scanned instead
+    @staticmethod
+    def _indexed_end(data, size, offsets):
+        if not offsets:
+            return 0
+        if offsets[0] != 0:
+            return None
+        previous = -RECORD_HEADER.size
+        for offset in offsets:
+            if offset < previous + RECORD_HEADER.size:
+                return None
+            previous = offset
+        if previous + RECORD_HEADER.size > size:
+            return None
+        (length,) = RECORD_HEADER.unpack_from(data, previous)
+        end = previous + RECORD_HEADER.size + length
+        return end if end <= size else None
+
+    # Queue a block for writing; the queue is flushed when it is full or has waited long enough
+    def append(self, block):
+        payload = json.dumps(block, sort_keys=True).encode()
+        with self.lock:
+            self.buffer.append(RECORD_HEADER.pack(len(payload)) + payload)
+
+            if len(self.buffer) >= self.batch_size:
+                self._flush()
+            elif self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    # Write the queued blocks to the log and fsync it, then record them in the index and fsync that
+    # The index is only updated once the blocks are durable, so it never points past the log
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+
+        if self.buffer:
+            self.log.seek(0, os.SEEK_END)
+            for record in self.buffer:
+                self.offsets.append(self.log_end)
+                self.log.write(record)
+                self.log_end += len(record)
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self.buffer = []
+
+        if self.indexed != len(self.offsets):
+            self.index.seek(INDEX_HEADER.size + self.indexed * self.offsets.itemsize)
+            self.index.write(self.offsets[self.indexed:].tobytes())
+            self.index.seek(0)
+            self.index.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self.offsets)))
+            self.index.truncate(INDEX_HEADER.size + len(self.offsets) * self.offsets.itemsize)
+            self.index.flush()
+            os.fsync(self.index.fileno())
+            self.indexed = len(self.offsets)
+
+    # Drop every block from position count on, e.g. before writing the blocks of a fork
+    def truncate(self, count):
+        with self.lock:
+            self._flush()
+            if count < len(self.offsets):
+                self._truncate(count)
+
+    def _truncate(self, count):
+        self.log_end = self.offsets[count]
+        del self.offsets[count:]
+        self.log.truncate(self.log_end)
+        self.log.flush()
+        os.fsync(self.log.fileno())
+
+        self.indexed = len(self.offsets)
+        self.index.seek(0)
+        self.index.write(INDEX_HEADER.pack(INDEX_MAGIC, self.indexed))
+        self.index.truncate(INDEX_HEADER.size + self.indexed * self.offsets.itemsize)
+        self.index.flush()
+        os.fsync(self.index.fileno())
+
+    # Replace the stored blocks from position start on with the blocks of the given chain from there on
+    def replace_from(self, start, chain):
+        with self.lock:
+            self.truncate(start)
+            for block in chain[start:]:
+                self.append(block)
+            self.flush()
+
+    # Write any queued blocks and close the files
+    def close(self):
+        self.flush()
+        self.log.close()
+        self.index.close()
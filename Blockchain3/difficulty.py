@@ -0,0 +1,104 @@
+import hashlib
+from fractions import Fraction
+
+# The proof of work is a SHA-256 digest, so targets are 256-bit integers
+DIGEST_BITS = 256
+
+# Number of recent blocks whose timestamps are used to retarget
+RETARGET_WINDOW = 10
+
+# A single retarget never changes the target by more than this factor
+MAX_ADJUSTMENT = 4
+
+
+# Convert a number of leading zero bits into the largest digest value that still has them
+def target_from_zero_bits(bits):
+    return (1 << (DIGEST_BITS - bits)) - 1
+
+
+# Return how many leading zero bits every digest meeting the target has
+def zero_bits(target):
+    return DIGEST_BITS - target.bit_length()
+
+
+# "0000" hex prefix = 16 leading zero bits, the rule the nodes have always used
+DEFAULT_TARGET = target_from_zero_bits(16)
+
+# Retargeting never makes proofs easier than 8 leading zero bits or harder than 64
+EASIEST_TARGET = target_from_zero_bits(8)
+HARDEST_TARGET = target_from_zero_bits(64)
+
+
+# Limit a target to the range retargeting may move it in
+def clamp_target(target, min_target=HARDEST_TARGET, max_target=EASIEST_TARGET):
+    return max(min_target, min(target, max_target))
+
+
+# A block may claim a timestamp at most this many seconds ahead of the validating node's clock
+MAX_FUTURE_DRIFT = 2 * 60 * 60
+
+
+# Return the work a block meeting the target stands for: the expected number of hashes needed to find it
+def block_work(target):
+    return (1 << DIGEST_BITS) // target
+
+
+# Return the total work of a chain, the sum of the work of its blocks
+# Chains are compared by this and not by their length, since a longer chain of easier blocks is cheaper to forge
+def chain_work(blocks):
+    return sum(block_work(block.get('target', DEFAULT_TARGET)) for block in blocks)
+
+
+# Encode the target as 32 big-endian bytes
+# Comparing equal-length big-endian byte strings orders them like the integers they encode,
+# so a raw digest can be checked against this without converting it to an integer or hex
+def target_bytes(target):
+    return target.to_bytes(DIGEST_BITS // 8, 'big')
+
+
+# Check a raw SHA-256 digest (bytes) against the target
+def meets_target(digest, target=DEFAULT_TARGET):
+    return digest <= target_bytes(target)
+
+
+# Return the raw digest that the proof of work pow for last_pow must bring under the target
+def proof_digest(last_pow, pow):
+    return hashlib.sha256(f'{last_pow}{pow}'.encode()).digest()
+
+
+# Scale the target by how far the observed block time is from the wanted one
+# Blocks arriving too fast lower the target (harder), blocks arriving too slowly raise it (easier)
+# timestamps are the creation times of the most recent blocks, oldest first
+# block_time must be positive (raises ValueError otherwise)
+def retarget(target, timestamps, block_time, min_target=HARDEST_TARGET, max_target=EASIEST_TARGET):
+    if not block_time > 0:
+        raise ValueError('block_time must be positive')
+    if len(timestamps) < 2:
+        return target
+
+    # Exact fractions keep the 256-bit target scaling precise for any block time, however small
+    actual = Fraction(timestamps[-1]) - Fraction(timestamps[0])
+    expected = Fraction(block_time) * (len(timestamps) - 1)
+
+    actual = max(actual, expected / MAX_ADJUSTMENT)
+    actual = min(actual, expected * MAX_ADJUSTMENT)
+
+    new_target = target * actual.numerator * expected.denominator // (actual.denominator * expected.numerator)
+    return clamp_target(new_target, min_target, max_target)
+
+
+# Return the target the block following the given blocks must meet
+# Blocks without a 'target' field were mined under the fixed "0000" rule
+# block_time=None keeps the target of the last block (no retargeting)
+# The result is always clamped to [HARDEST_TARGET, EASIEST_TARGET], so a block claiming an out-of-range
+# target can never make the blocks after it easier
+def next_target(blocks, block_time=None, default=DEFAULT_TARGET):
+    if not blocks:
+        return clamp_target(default)
+
+    last_target = blocks[-1].get('target', DEFAULT_TARGET)
+    if block_time is None:
+        return clamp_target(last_target)
+
+    recent = blocks[-RETARGET_WINDOW:]
+    return retarget(last_target, [block['timestamp'] for block in recent], block_time)
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Event
+
+from difficulty import DEFAULT_TARGET, meets_target, proof_digest, target_bytes
+
+# Number of nonces handed to a worker in one task
+# Small enough that a cancelled search stops quickly, large enough to hide the IPC overhead
+DEFAULT_CHUNK_SIZE = 20000
+
+# How often (in nonces) a worker checks whether another worker already found a proof
+STOP_CHECK_INTERVAL = 1024
+
+_stop_event = None
+
+
+# Verify if a given proof of work is valid by checking its hash against the difficulty target
+def valid_proof(last_pow, pow, target=DEFAULT_TARGET):
+    return meets_target(proof_digest(last_pow, pow), target)
+
+
+# Search the nonce range [start, stop) and return the lowest valid proof in it, or None
+# The constant last_pow prefix is hashed once and the hasher state is copied for each nonce,
+# and the difficulty is checked on the raw digest bytes instead of the hex string
+# stop_event (optional) is polled every STOP_CHECK_INTERVAL nonces to abandon the search early
+def search_range(last_pow, start, stop=None, stop_event=None, target=DEFAULT_TARGET):
+    prefix = hashlib.sha256(f'{last_pow}'.encode())
+    limit = target_bytes(target)
+    pow = start
+    while stop is None or pow < stop:
+        if stop_event is not None and (pow - start) % STOP_CHECK_INTERVAL == 0 and stop_event.is_set():
+            return None
+        guess = prefix.copy()
+        guess.update(str(pow).encode())
+        if guess.digest() <= limit:
+            return pow
+        pow += 1
+    return None
+
+
+# Walk nonces one at a time on the calling thread until a valid proof is found
+def search_sequential(last_pow, start=0, target=DEFAULT_TARGET):
+    return search_range(last_pow, start, target=target)
+
+
+# Store the shared stop event in every worker process of the pool
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+
+# Pool task: search one chunk of the nonce space, giving up once another worker found a proof
+def _search_chunk(last_pow, start, stop, target):
+    return search_range(last_pow, start, stop, _stop_event, target)
+
+
+class ParallelMiner:
+    # Split the nonce space into fixed-size chunks and search them on a pool of worker processes
+    # workers=None uses every available core
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._stop_event = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    # Start the process pool on first use so creating a miner stays cheap
+    def _get_executor(self):
+        if self._executor is None:
+            self._stop_event = Event()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self._stop_event,)
+            )
+        return self._executor
+
+    # Find the lowest proof for last_pow that meets the target, the same value the sequential loop returns
+    # Chunks are consumed in nonce order, so the first chunk that yields a proof holds the lowest one;
+    # at that point every chunk still running is further along and all workers are told to stop
+    def search(self, last_pow, target=DEFAULT_TARGET):
+        if self.workers == 1:
+            return search_sequential(last_pow, target=target)
+
+        with self._lock:
+            executor = self._get_executor()
+            self._stop_event.clear()
+
+            pending = deque()
+            next_start = 0
+            try:
+                while True:
+                    while len(pending) < self.workers * 2:
+                        pending.append(executor.submit(
+                            _search_chunk, last_pow, next_start, next_start + self.chunk_size, target
+                        ))
+                        next_start += self.chunk_size
+
+                    pow = pending.popleft().result()
+                    if pow is not None:
+                        return pow
+            finally:
+                self._stop_event.set()
+                for future in pending:
+                    future.cancel()
+                for future in pending:
+                    if not future.cancelled():
+                        future.exception()
+
+    # Shut down the worker processes
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
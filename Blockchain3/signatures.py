@@ -0,0 +1,133 @@
+import base64
+import hashlib
+
+from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+
+# Length in bytes of a key id, the short sender identifier of a registered public key (40 hex characters)
+KEY_ID_SIZE = 20
+
+
+# RSA-2048 with PKCS#1 v1.5 padding, the scheme BLOCKCHAIN3 has always used
+class RSAScheme:
+    name = 'rsa'
+    public_key_type = rsa.RSAPublicKey
+
+    @staticmethod
+    def generate():
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    @staticmethod
+    def sign(private_key, data):
+        return private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+    @staticmethod
+    def verify(public_key, signature, data):
+        public_key.verify(signature, data, padding.PKCS1v15(), hashes.SHA256())
+
+
+# ECDSA over SECP256K1, the curve of the BLOCKCHAIN4 wallets
+class SECP256K1Scheme:
+    name = 'secp256k1'
+    public_key_type = ec.EllipticCurvePublicKey
+
+    @staticmethod
+    def generate():
+        return ec.generate_private_key(ec.SECP256K1())
+
+    @staticmethod
+    def sign(private_key, data):
+        return private_key.sign(data, ec.ECDSA(hashes.SHA256()))
+
+    @staticmethod
+    def verify(public_key, signature, data):
+        public_key.verify(signature, data, ec.ECDSA(hashes.SHA256()))
+
+
+# Ed25519: 32-byte keys, 64-byte signatures and the cheapest verification of the three
+class Ed25519Scheme:
+    name = 'ed25519'
+    public_key_type = ed25519.Ed25519PublicKey
+
+    @staticmethod
+    def generate():
+        return ed25519.Ed25519PrivateKey.generate()
+
+    @staticmethod
+    def sign(private_key, data):
+        return private_key.sign(data)
+
+    @staticmethod
+    def verify(public_key, signature, data):
+        public_key.verify(signature, data)
+
+
+SCHEMES = {scheme.name: scheme for scheme in (RSAScheme, SECP256K1Scheme, Ed25519Scheme)}
+
+
+# Return the scheme of a parsed public or private key
+# Raise ValueError for key types the node does not accept (for example ECDSA on another curve)
+def scheme_of(key):
+    if isinstance(key, (rsa.RSAPrivateKey, ed25519.Ed25519PrivateKey, ec.EllipticCurvePrivateKey)):
+        key = key.public_key()
+    for scheme in SCHEMES.values():
+        if isinstance(key, scheme.public_key_type):
+            if scheme is SECP256K1Scheme and not isinstance(key.curve, ec.SECP256K1):
+                break
+            return scheme
+    raise ValueError('Unsupported key type')
+
+
+# Parse a PEM public key (str) of one of the accepted schemes
+# Raise ValueError if it cannot be parsed or its scheme is not accepted
+def load_public_key(pem):
+    try:
+        key = serialization.load_pem_public_key(pem.encode())
+    except UnsupportedAlgorithm:
+        raise ValueError('Unsupported key type')
+    scheme_of(key)
+    return key
+
+
+# Return the key id of a parsed public key: the hex of the first KEY_ID_SIZE bytes of the SHA-256 of its
+# DER encoding
+def key_id(public_key):
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(der).digest()[:KEY_ID_SIZE].hex()
+
+
+# Generate a key pair of the given scheme and return the private key and public key in PEM format
+def generate_keys(scheme='rsa'):
+    private_key = SCHEMES[scheme].generate()
+
+    private_key_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    ).decode()
+
+    public_key_pem = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+
+    return private_key_pem, public_key_pem
+
+
+# Sign data with a PEM private key of any accepted scheme and return the base64-encoded signature
+def sign(private_key_pem, data):
+    private_key = serialization.load_pem_private_key(private_key_pem.encode(), password=None)
+    return base64.b64encode(scheme_of(private_key).sign(private_key, data)).decode()
+
+
+# Check a base64-encoded signature of data against a parsed public key
+def verify(public_key, signature, data):
+    try:
+        scheme_of(public_key).verify(public_key, base64.b64decode(signature), data)
+        return True
+    except (InvalidSignature, ValueError, TypeError):
+        return False
@@ -4,6 +4,11 @@ from cryptography.hazmat.primitives.asymmetric import rsa, ec
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 
+import envelope
+from ledger import Ledger, make_transfer
+from merkle import MerkleTree, verify_proof
+from wallet import private_keys, public_keys
+
 
 # === Task 2: SHA-3 vs SHA-256 === #
 def task_2_hashing_example():
@@ -57,7 +62,11 @@ def task_2_hashing_example():
 
 
 # === Task 3 & 4: Merkle Tree with Verification === #
+# A MerkleTree keeps its levels and returns its root directly; any other sequence is hashed from scratch
 def calculate_merkle_root(transactions):
+    if isinstance(transactions, MerkleTree):
+        return transactions.root()
+
     if not transactions:
         return None
 
@@ -79,15 +88,28 @@ def calculate_merkle_root(transactions):
     return current_level[0]
 
 
+# With a MerkleTree the transaction's audit path is checked (O(log n)); with a list the whole root is recomputed
 def verify_transaction(transactions, target_transaction, expected_merkle_root):
     if target_transaction not in transactions:
         return False
 
+    if isinstance(transactions, MerkleTree):
+        index = transactions.index(target_transaction)
+        proof = transactions.proof(index)
+        return verify_transaction_proof(target_transaction, index, len(transactions), proof, expected_merkle_root)
+
     # Calculate Merkle root after adding the transaction
     calculated_merkle_root = calculate_merkle_root(transactions)
     return calculated_merkle_root == expected_merkle_root
 
 
+# Light-client check: verify the transaction at position index of a block with leaf_count transactions against
+# a Merkle root using only its audit path (MerkleTree.proof), without the other transactions of the block
+def verify_transaction_proof(target_transaction, index, leaf_count, proof, expected_merkle_root):
+    return verify_proof(target_transaction, index, leaf_count, proof, expected_merkle_root)
+
+
+# With a MerkleTree only the path of the new transaction is hashed; with a list the whole root is recomputed
 def add_transaction(transactions, new_transaction):
     transactions.append(new_transaction)
     return calculate_merkle_root(transactions)
@@ -118,14 +140,21 @@ def serialize_key(key, is_private=False):
                                 format=serialization.PublicFormat.SubjectPublicKeyInfo)
 
 
-def encrypt_message(public_key, message):
+# RSA-OAEP alone can only encrypt about 190 bytes with a 2048-bit key; hybrid=True encrypts a message of any size
+# with AES-GCM and RSA-encrypts only its key (see envelope.py). public_key may then also be a list of keys,
+# which encrypts the message once for all of them
+def encrypt_message(public_key, message, hybrid=False):
+    if hybrid:
+        return envelope.encrypt(public_key, message.encode())
     ciphertext = public_key.encrypt(message.encode(),
                                     padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(),
                                                  label=None))
     return ciphertext
 
 
-def decrypt_message(private_key, ciphertext):
+def decrypt_message(private_key, ciphertext, hybrid=False):
+    if hybrid:
+        return envelope.decrypt(private_key, ciphertext).decode()
     decrypted_message = private_key.decrypt(ciphertext, padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()),
                                                                      algorithm=hashes.SHA256(), label=None))
     return decrypted_message.decode()
@@ -153,6 +182,13 @@ def task_5_rsa_example():
     decrypted_message_by_alice = decrypt_message(alice_private_key, encrypted_message_for_alice)
     print("Alice decrypted the message from Bob:", decrypted_message_by_alice)
 
+    # A long message for both of them, too large for RSA alone
+    long_message = "Meeting notes: " + "lorem ipsum " * 10000
+    encrypted_long_message = encrypt_message([alice_public_key, bob_public_key], long_message, hybrid=True)
+    print(f"Sent an encrypted {len(long_message)}-character message to Alice and Bob.")
+    print("Alice can read it:", decrypt_message(alice_private_key, encrypted_long_message, hybrid=True) == long_message)
+    print("Bob can read it:", decrypt_message(bob_private_key, encrypted_long_message, hybrid=True) == long_message)
+
 
 # === Task 6: Wallet and Transaction Example === #
 def create_wallet():
@@ -166,15 +202,16 @@ def create_wallet():
     return private_pem, public_pem
 
 
+# Parsed keys are cached (see wallet.KeyCache), so only the first use of a PEM pays for parsing it
 def sign_transaction(private_key_pem, transaction):
-    private_key = serialization.load_pem_private_key(private_key_pem, password=None)
+    private_key = private_keys.load(private_key_pem)
     signature = private_key.sign(transaction.encode(), ec.ECDSA(hashes.SHA256()))
     return signature
 
 
 def verify_transaction_signature(public_key_pem, transaction, signature):
-    public_key = serialization.load_pem_public_key(public_key_pem)
     try:
+        public_key = public_keys.load(public_key_pem)
         public_key.verify(signature, transaction.encode(), ec.ECDSA(hashes.SHA256()))
         return True
     except Exception:
@@ -206,34 +243,32 @@ def task_6_wallet_and_transaction_example():
     bob_private_key, bob_public_key = create_wallet()
 
     # Example: Wallet transactions
-    wallet_balances = {}
-    add_balance(wallet_balances, alice_public_key, 100)
-    add_balance(wallet_balances, bob_public_key, 50)
+    # The ledger keys balances by short address ids and checks and deducts a transfer atomically
+    ledger = Ledger()
+    alice = ledger.register(alice_public_key)
+    bob = ledger.register(bob_public_key)
+    ledger.deposit(alice, 100)
+    ledger.deposit(bob, 50)
 
-    print("Alice's Balance:", check_balance(wallet_balances, alice_public_key))
-    print("Bob's Balance:", check_balance(wallet_balances, bob_public_key))
+    print("Alice's Balance:", ledger.balance(alice))
+    print("Bob's Balance:", ledger.balance(bob))
 
     # Alice sends $30 to Bob
-    transaction = "Alice sends $30 to Bob"
-    signature = sign_transaction(alice_private_key, transaction)
-
-    if verify_transaction_signature(alice_public_key, transaction, signature):
-        if deduct_balance(wallet_balances, alice_public_key, 30):
-            add_balance(wallet_balances, bob_public_key, 30)
-            print("Transaction successful!")
-        else:
-            print("Insufficient funds!")
+    result = ledger.transfer(make_transfer(alice_private_key, alice, bob, 30, ledger.next_sequence(alice)))
+    if result['accepted']:
+        print("Transaction successful!")
     else:
-        print("Transaction verification failed!")
+        print("Transaction failed:", result['error'])
 
-    print("Alice's Balance after transaction:", check_balance(wallet_balances, alice_public_key))
-    print("Bob's Balance after transaction:", check_balance(wallet_balances, bob_public_key))
+    print("Alice's Balance after transaction:", ledger.balance(alice))
+    print("Bob's Balance after transaction:", ledger.balance(bob))
 
 
 # Run all tasks
-task_2_hashing_example()
-task_3_4_merkle_tree_example = lambda: print("\nTask 3 & 4") or print("Initial Merkle Root:",
-                                                                      calculate_merkle_root(["T1", "T2"]))
-task_3_4_merkle_tree_example()
-task_5_rsa_example()
-task_6_wallet_and_transaction_example()
+if __name__ == '__main__':
+    task_2_hashing_example()
+    task_3_4_merkle_tree_example = lambda: print("\nTask 3 & 4") or print("Initial Merkle Root:",
+                                                                          calculate_merkle_root(["T1", "T2"]))
+    task_3_4_merkle_tree_example()
+    task_5_rsa_example()
+    task_6_wallet_and_transaction_example()
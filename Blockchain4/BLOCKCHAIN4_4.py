@@ -3,6 +3,9 @@ from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
+
+import envelope
+
 # Generate a public/private key pair
 private_key = rsa.generate_private_key(
     public_exponent=65537,
@@ -43,4 +46,10 @@ decrypted_message = private_key.decrypt(
 # Display the results
 print("Original Message:", message.decode())
 print("Ciphertext:", ciphertext)
-print("Decrypted Message:", decrypted_message.decode())
\ No newline at end of file
+print("Decrypted Message:", decrypted_message.decode())
+# Messages longer than about 190 bytes do not fit in one RSA block: encrypt them with AES-GCM and only
+# the AES key with RSA (hybrid encryption, see envelope.py)
+attachment = b"Large attachment. " * 10000
+sealed_attachment = envelope.encrypt(public_key, attachment)
+print("Attachment size:", len(attachment), "Encrypted size:", len(sealed_attachment))
+print("Decrypted Attachment Matches:", envelope.decrypt(private_key, sealed_attachment) == attachment)
@@ -5,6 +5,8 @@ from cryptography.hazmat.primitives.asymmetric import utils
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import hashes
 
+from wallet import private_keys, public_keys
+
 
 # Function to generate a wallet (public and private key pair)
 def create_wallet():
@@ -22,9 +24,9 @@ def create_wallet():
     return private_pem, public_pem
 
 
-# Function to sign a transaction using the private key
+# Function to sign a transaction using the private key (parsed keys are cached, see wallet.KeyCache)
 def sign_transaction(private_key_pem, transaction):
-    private_key = serialization.load_pem_private_key(private_key_pem, password=None)
+    private_key = private_keys.load(private_key_pem)
     signature = private_key.sign(
         transaction.encode(),
         ec.ECDSA(hashes.SHA256())
@@ -34,8 +36,8 @@ def sign_transaction(private_key_pem, transaction):
 
 # Function to verify a received transaction using the sender's public key
 def verify_transaction(public_key_pem, transaction, signature):
-    public_key = serialization.load_pem_public_key(public_key_pem)
     try:
+        public_key = public_keys.load(public_key_pem)
         public_key.verify(
             signature,
             transaction.encode(),
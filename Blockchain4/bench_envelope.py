@@ -0,0 +1,57 @@
+import os
+from argparse import ArgumentParser
+from time import perf_counter
+
+import envelope
+from BLOCKCHAIN4 import generate_key_pair
+
+# Largest message RSA-OAEP with SHA-256 can encrypt under a 2048-bit key
+RSA_BLOCK = 2048 // 8 - 2 * 32 - 2
+
+
+# Encrypt and decrypt a payload the only way plain RSA can: one RSA-OAEP operation per 190-byte block
+def rsa_blocks(private_key, public_key, data):
+    blocks = [public_key.encrypt(data[i:i + RSA_BLOCK], envelope.OAEP) for i in range(0, len(data), RSA_BLOCK)]
+    return b''.join(private_key.decrypt(block, envelope.OAEP) for block in blocks)
+
+
+def timed(fn, *args):
+    start = perf_counter()
+    result = fn(*args)
+    return perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', default='1024,65536,1048576,16777216', help='comma separated payload sizes')
+    parser.add_argument('--rsa-limit', default=65536, type=int, help='largest payload timed with plain RSA blocks')
+    parser.add_argument('--recipients', default='1,10,100', help='comma separated recipient counts')
+    args = parser.parse_args()
+
+    private_key, public_key = generate_key_pair()
+
+    print(f"{'bytes':>10} {'rsa blocks':>11} {'encrypt':>9} {'decrypt':>9} {'MB/s':>8}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        data = os.urandom(size)
+        rsa_time = '-'
+        if size <= args.rsa_limit:
+            seconds, result = timed(rsa_blocks, private_key, public_key, data)
+            assert result == data
+            rsa_time = f'{seconds:.3f}s'
+
+        encrypt_time, sealed = timed(envelope.encrypt, public_key, data)
+        decrypt_time, opened = timed(envelope.decrypt, private_key, sealed)
+        assert opened == data
+        print(f"{size:>10} {rsa_time:>11} {encrypt_time:>8.3f}s {decrypt_time:>8.3f}s "
+              f"{size / (encrypt_time + decrypt_time) / 1e6:>8.1f}")
+
+    print()
+    data = os.urandom(1048576)
+    keys = [generate_key_pair() for _ in range(max(int(count) for count in args.recipients.split(',')))]
+    print(f"{'recipients':>10} {'one envelope':>13} {'envelope each':>14}")
+    for count in (int(count) for count in args.recipients.split(',')):
+        public_keys = [public for _, public in keys[:count]]
+        shared_time, sealed = timed(envelope.encrypt, public_keys, data)
+        each_time, _ = timed(lambda: [envelope.encrypt(key, data) for key in public_keys])
+        assert envelope.decrypt(keys[count - 1][0], sealed) == data
+        print(f"{count:>10} {shared_time:>12.3f}s {each_time:>13.3f}s")
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import platform
+import ssl
+import statistics
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+# Hash functions compared; blake2b is cut to a 32-byte digest so all three give 256-bit hashes
+ALGORITHMS = {
+    'sha256': hashlib.sha256,
+    'sha3_256': hashlib.sha3_256,
+    'blake2b': lambda data=b'': hashlib.blake2b(data, digest_size=32),
+}
+
+# Payload sizes from a short transaction string up to 1 MB
+DEFAULT_SIZES = (32, 256, 4096, 65536, 1048576)
+
+# Every measurement hashes about this many bytes, and at least MIN_CALLS payloads
+BYTES_PER_RUN = 16 * 2 ** 20
+MIN_CALLS = 16
+
+
+# Hash calls payloads one at a time, as task_2_hashing_example does
+def run_single(new, payload, calls, hex_output):
+    if hex_output:
+        for _ in range(calls):
+            new(payload).hexdigest()
+    else:
+        for _ in range(calls):
+            new(payload).digest()
+
+
+# Hash calls messages that share the payload as a prefix and differ in an 8-byte suffix (like a nonce),
+# hashing each message from scratch
+def run_prefixed(new, payload, calls, hex_output):
+    finish = 'hexdigest' if hex_output else 'digest'
+    for nonce in range(calls):
+        getattr(new(payload + nonce.to_bytes(8, 'big')), finish)()
+
+
+# Hash the same messages as run_prefixed by hashing the prefix once and copying that state for each suffix
+def run_midstate(new, payload, calls, hex_output):
+    prefix = new(payload)
+    finish = 'hexdigest' if hex_output else 'digest'
+    for nonce in range(calls):
+        guess = prefix.copy()
+        guess.update(nonce.to_bytes(8, 'big'))
+        getattr(guess, finish)()
+
+
+# Split the single calls across threads of the given pool
+# Note: CPython's hashlib only releases the GIL for inputs of 2 KiB or more, so small payloads do not scale
+def run_threads(pool, threads, new, payload, calls, hex_output):
+    share = -(-calls // threads)
+    futures = [pool.submit(run_single, new, payload, share, hex_output) for _ in range(threads)]
+    for future in futures:
+        future.result()
+    return share * threads
+
+
+# Time fn after warm-up rounds and return the median of the timed repeats in seconds
+def measure(fn, warmup, repeats):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeats):
+        start = perf_counter()
+        fn()
+        timings.append(perf_counter() - start)
+    return statistics.median(timings)
+
+
+# Build one result record for calls hashes of size-byte payloads that took seconds
+# mb_per_s counts the bytes of the messages whose hash was produced (payload plus suffix in the prefixed and
+# midstate modes), so for the midstate mode it is the effective rate, not the rate of bytes fed to the hash
+def result(algorithm, mode, size, hex_output, threads, calls, seconds):
+    message_size = size + 8 if mode in ('prefixed', 'midstate') else size
+    return {
+        'algorithm': algorithm,
+        'mode': mode,
+        'payload_bytes': size,
+        'hex': hex_output,
+        'threads': threads,
+        'calls': calls,
+        'seconds': seconds,
+        'ns_per_call': seconds / calls * 1e9,
+        'mb_per_s': message_size * calls / seconds / 1e6,
+    }
+
+
+# Run every algorithm, payload size, output encoding and mode and return the list of result records
+def run_suite(algorithms, sizes, threads, warmup, repeats):
+    results = []
+    pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+    try:
+        for name in algorithms:
+            new = ALGORITHMS[name]
+            for size in sizes:
+                payload = os.urandom(size)
+                calls = max(MIN_CALLS, BYTES_PER_RUN // size)
+                for hex_output in (False, True):
+                    for mode, run in (('single', run_single), ('prefixed', run_prefixed),
+                                      ('midstate', run_midstate)):
+                        seconds = measure(lambda: run(new, payload, calls, hex_output), warmup, repeats)
+                        results.append(result(name, mode, size, hex_output, 1, calls, seconds))
+
+                    if pool is not None:
+                        total = -(-calls // threads) * threads
+                        seconds = measure(lambda: run_threads(pool, threads, new, payload, calls, hex_output),
+                                          warmup, repeats)
+                        results.append(result(name, 'threads', size, hex_output, threads, total, seconds))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+
+# Describe the machine and interpreter, so results of different runs can be compared
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'openssl': ssl.OPENSSL_VERSION,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Benchmark the hash functions used by the chain and print the results as JSON')
+    parser.add_argument('--algorithms', default=','.join(ALGORITHMS), help='comma separated hash functions')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='comma separated payload sizes')
+    parser.add_argument('--threads', default=os.cpu_count(), type=int, help='threads for the parallel runs')
+    parser.add_argument('--warmup', default=1, type=int, help='untimed rounds before each measurement')
+    parser.add_argument('--repeats', default=5, type=int, help='timed rounds per measurement (median is kept)')
+    parser.add_argument('-o', '--output', help='write the JSON to this file instead of stdout')
+    args = parser.parse_args()
+
+    report = {
+        'environment': environment(),
+        'settings': {'warmup': args.warmup, 'repeats': args.repeats, 'bytes_per_run': BYTES_PER_RUN},
+        'results': run_suite(args.algorithms.split(','), [int(size) for size in args.sizes.split(',')],
+                             args.threads, args.warmup, args.repeats),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,89 @@
+import random
+import threading
+from argparse import ArgumentParser
+from time import perf_counter
+
+from BLOCKCHAIN4 import create_wallet
+from ledger import Ledger, make_transfer
+
+INITIAL_BALANCE = 1000
+
+
+# Pre-sign batches of random transfers between the wallets, so the timed run measures the ledger
+# Amounts are large enough relative to the balances that some batches fail for insufficient funds, and
+# sequence numbers rise in batch order, so a batch applied after a later batch of the same sender fails as stale
+def signed_batches(wallets, addresses, batches, batch_size, seed):
+    rng = random.Random(seed)
+    result = []
+    sequence = 0
+    for _ in range(batches):
+        batch = []
+        for _ in range(batch_size):
+            sender, recipient = rng.sample(range(len(addresses)), 2)
+            sequence += 1
+            batch.append(make_transfer(wallets[sender][0], addresses[sender], addresses[recipient],
+                                       rng.randint(1, INITIAL_BALANCE // 2), sequence))
+        result.append(batch)
+    return result
+
+
+# Apply every batch from the given number of threads at once and return (seconds, committed, rejected)
+def stress(ledger, batches, threads):
+    committed = []
+    rejected = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads)
+
+    def worker(own):
+        start_barrier.wait()
+        for batch in own:
+            accepted = ledger.apply_batch(batch)[0]['accepted']
+            with lock:
+                (committed if accepted else rejected).append(batch)
+
+    workers = [threading.Thread(target=worker, args=(batches[i::threads],)) for i in range(threads)]
+    start = perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return perf_counter() - start, committed, rejected
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-w', '--wallets', default=50, type=int, help='number of wallets (fewer means more contention)')
+    parser.add_argument('-b', '--batches', default=2000, type=int, help='number of batches')
+    parser.add_argument('-s', '--batch-size', default=4, type=int, help='transfers per batch')
+    parser.add_argument('--threads', default='1,4,16', help='comma separated thread counts')
+    args = parser.parse_args()
+
+    wallets = [create_wallet() for _ in range(args.wallets)]
+    print(f"{'threads':>7} {'transfers/s':>12} {'committed':>10} {'rejected':>9}  totals")
+    for threads in (int(count) for count in args.threads.split(',')):
+        ledger = Ledger()
+        addresses = [ledger.register(public_key) for _, public_key in wallets]
+        for address in addresses:
+            ledger.deposit(address, INITIAL_BALANCE)
+        batches = signed_batches(wallets, addresses, args.batches, args.batch_size, seed=threads)
+
+        seconds, committed, rejected = stress(ledger, batches, threads)
+
+        # Money is only moved, never created, and no wallet may go negative
+        balances = [ledger.balance(address) for address in addresses]
+        if ledger.total() != INITIAL_BALANCE * len(addresses) or min(balances) < 0:
+            raise AssertionError('ledger totals are wrong')
+        # Replaying a committed transfer is always rejected
+        if committed and ledger.transfer(committed[0][0])['accepted']:
+            raise AssertionError('a replayed transfer was accepted')
+        # The final balances are exactly the committed batches applied to the initial ones
+        expected = dict.fromkeys(addresses, INITIAL_BALANCE)
+        for batch in committed:
+            for t in batch:
+                expected[t['sender']] -= t['amount']
+                expected[t['recipient']] += t['amount']
+        if balances != [expected[address] for address in addresses]:
+            raise AssertionError('final balances do not match the committed batches')
+
+        transfers = args.batches * args.batch_size
+        print(f"{threads:>7} {transfers / seconds:>12.0f} {len(committed):>10} {len(rejected):>9}  ok")
@@ -0,0 +1,81 @@
+import os
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+from BLOCKCHAIN4 import calculate_merkle_root
+from merkle import MerkleTree, build_merkle_root, stream_merkle_root
+
+
+# Average time of one call of fn over the given arguments
+def time_per_call(fn, arguments):
+    start = perf_counter()
+    for argument in arguments:
+        fn(argument)
+    return (perf_counter() - start) / len(arguments)
+
+
+# Compare per-update cost of the persistent tree with recomputing the root from the full list
+def bench_updates(leaves, updates):
+    transactions = [f'Transaction {i}' for i in range(leaves)]
+
+    start = perf_counter()
+    tree = MerkleTree(transactions)
+    build_time = perf_counter() - start
+
+    start = perf_counter()
+    full_root = calculate_merkle_root(transactions)
+    full_time = perf_counter() - start
+    if full_root != tree.root():
+        raise AssertionError('tree root differs from calculate_merkle_root')
+
+    positions = [random.randrange(leaves) for _ in range(updates)]
+    update_time = time_per_call(lambda i: tree.update(i, f'Updated {i}'), positions)
+    append_time = time_per_call(tree.append, [f'Appended {i}' for i in range(updates)])
+    pop_time = time_per_call(lambda _: tree.pop(), range(updates))
+
+    return build_time, full_time, update_time, append_time, pop_time
+
+
+# Time calculate_merkle_root against the streaming builder and the bulk builder (compat and raw modes)
+# for one block size
+def bench_bulk(leaves, workers):
+    transactions = [f'Transaction {i}' for i in range(leaves)]
+    timings = {}
+    roots = {}
+    for name, build in (
+            ('calculate_merkle_root', calculate_merkle_root),
+            ('streaming', lambda txs: stream_merkle_root(iter(txs))),
+            ('bulk compat, 1 thread', lambda txs: build_merkle_root(txs, workers=1)),
+            (f'bulk compat, {workers} threads', lambda txs: build_merkle_root(txs, workers=workers)),
+            (f'bulk raw, {workers} threads', lambda txs: build_merkle_root(txs, compat=False, workers=workers))):
+        start = perf_counter()
+        roots[name] = build(transactions)
+        timings[name] = perf_counter() - start
+
+    if len({root for name, root in roots.items() if 'raw' not in name}) != 1:
+        raise AssertionError('streaming or bulk compat root differs from calculate_merkle_root')
+    return timings
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='comma separated leaf counts')
+    parser.add_argument('-u', '--updates', default=1000, type=int, help='updates timed per size')
+    parser.add_argument('--bulk-sizes', default='10000,100000,1000000', help='comma separated block sizes')
+    parser.add_argument('--workers', default=os.cpu_count(), type=int, help='threads used by the bulk builder')
+    args = parser.parse_args()
+
+    print(f"{'leaves':>8} {'build':>9} {'full root':>10} {'update':>10} {'append':>10} {'pop':>10}")
+    for leaves in (int(size) for size in args.sizes.split(',')):
+        build, full, update, append, pop = bench_updates(leaves, args.updates)
+        print(f"{leaves:>8} {build:>8.3f}s {full:>9.3f}s {update * 1e6:>8.1f}us "
+              f"{append * 1e6:>8.1f}us {pop * 1e6:>8.1f}us")
+
+    print()
+    for leaves in (int(size) for size in args.bulk_sizes.split(',')):
+        timings = bench_bulk(leaves, args.workers)
+        baseline = timings['calculate_merkle_root']
+        print(f"{leaves} transactions")
+        for name, elapsed in timings.items():
+            print(f"  {name:<28} {elapsed:>8.3f}s {baseline / elapsed:>6.2f}x")
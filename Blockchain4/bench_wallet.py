@@ -0,0 +1,65 @@
+from argparse import ArgumentParser
+from time import perf_counter
+
+from cryptography.hazmat.primitives import serialization
+
+from BLOCKCHAIN4 import create_wallet
+from wallet import ECDSA_SHA256, WalletService, private_keys, public_keys
+
+
+# Sign and verify the way the original functions did, parsing the PEM key on every call
+def sign_uncached(private_key_pem, transaction):
+    private_key = serialization.load_pem_private_key(private_key_pem, password=None)
+    return private_key.sign(transaction.encode(), ECDSA_SHA256)
+
+
+def verify_uncached(public_key_pem, transaction, signature):
+    public_key = serialization.load_pem_public_key(public_key_pem)
+    try:
+        public_key.verify(signature, transaction.encode(), ECDSA_SHA256)
+        return True
+    except Exception:
+        return False
+
+
+# Operations per second of fn over the given argument tuples
+def rate(fn, items):
+    start = perf_counter()
+    fn(items)
+    return len(items) / (perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--transactions', default=4000, type=int, help='transactions signed and verified')
+    parser.add_argument('-w', '--wallets', default=100, type=int, help='number of distinct wallets')
+    parser.add_argument('--threads', default='1,4,16', help='comma separated thread counts')
+    args = parser.parse_args()
+
+    wallets = [create_wallet() for _ in range(args.wallets)]
+    transactions = [f'Transfer ${i} to wallet {(i + 1) % args.wallets}' for i in range(args.transactions)]
+    to_sign = [(wallets[i % args.wallets][0], tx) for i, tx in enumerate(transactions)]
+
+    signatures = [sign_uncached(*item) for item in to_sign]
+    to_verify = [(wallets[i % args.wallets][1], tx, signature)
+                 for i, (tx, signature) in enumerate(zip(transactions, signatures))]
+
+    print(f"{'':<28} {'sign/s':>10} {'verify/s':>10}")
+    sign_rate = rate(lambda items: [sign_uncached(*item) for item in items], to_sign)
+    verify_rate = rate(lambda items: [verify_uncached(*item) for item in items], to_verify)
+    print(f"{'parse per call, 1 thread':<28} {sign_rate:>10.0f} {verify_rate:>10.0f}")
+
+    for threads in (int(count) for count in args.threads.split(',')):
+        private_keys.clear()
+        public_keys.clear()
+        service = WalletService(workers=threads)
+        # Warm the key caches so the timed runs measure the signature operations
+        service.sign_many(to_sign[:args.wallets])
+        service.verify_many(to_verify[:args.wallets])
+
+        sign_rate = rate(service.sign_many, to_sign)
+        verify_rate = rate(service.verify_many, to_verify)
+        if not all(service.verify_many(to_verify)):
+            raise AssertionError('a valid signature failed to verify')
+        service.close()
+        print(f"{f'cached keys, {threads} threads':<28} {sign_rate:>10.0f} {verify_rate:>10.0f}")
@@ -0,0 +1,131 @@
+import hashlib
+import io
+import os
+import struct
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Hybrid (envelope) encryption for messages of any size
+# A fresh AES-256 key encrypts the payload with AES-GCM in chunks, and only that 32-byte key is encrypted with
+# RSA-OAEP, once per recipient; a recipient decrypts the key with one private-key operation and the rest is
+# symmetric work linear in the payload size
+#
+# Layout: magic, chunk size, nonce prefix, recipient count, then for each recipient its key id and the
+# RSA-wrapped AES key, then the encrypted chunks. The header is authenticated with every chunk, and each chunk
+# nonce holds its position and whether it is the last one, so chunks cannot be reordered, dropped or cut off
+
+MAGIC = b'ENV1'
+HEADER = struct.Struct('>4sI7sH')
+RECIPIENT = struct.Struct('>8sH')
+TAG_SIZE = 16
+
+# Plaintext bytes per AES-GCM chunk
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+OAEP = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+
+
+# Return the 8-byte id a recipient's public key is listed under in the header
+def recipient_id(public_key):
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(der).digest()[:8]
+
+
+# Nonce of chunk number index: the random prefix, the 4-byte index and a flag that is 1 for the last chunk
+def _nonce(prefix, index, last):
+    return prefix + index.to_bytes(4, 'big') + (b'\x01' if last else b'\x00')
+
+
+# Read up to size bytes, fewer only at the end of the source
+def _read(source, size):
+    data = source.read(size)
+    while len(data) < size:
+        more = source.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+# Encrypt everything readable from source for one or more RSA public keys and write the envelope to destination
+def encrypt_stream(public_keys, source, destination, chunk_size=DEFAULT_CHUNK_SIZE):
+    if not isinstance(public_keys, (list, tuple)):
+        public_keys = [public_keys]
+
+    key = AESGCM.generate_key(bit_length=256)
+    prefix = os.urandom(7)
+    header = HEADER.pack(MAGIC, chunk_size, prefix, len(public_keys))
+    for public_key in public_keys:
+        wrapped = public_key.encrypt(key, OAEP)
+        header += RECIPIENT.pack(recipient_id(public_key), len(wrapped)) + wrapped
+    destination.write(header)
+
+    aesgcm = AESGCM(key)
+    index = 0
+    chunk = _read(source, chunk_size)
+    while True:
+        # Read one chunk ahead so the last chunk is known when it is encrypted
+        following = _read(source, chunk_size) if len(chunk) == chunk_size else b''
+        last = not following
+        destination.write(aesgcm.encrypt(_nonce(prefix, index, last), chunk, header))
+        if last:
+            return
+        chunk = following
+        index += 1
+
+
+# Decrypt an envelope read from source with an RSA private key and write the payload to destination
+# Raise ValueError if the envelope is malformed or not addressed to the key, and
+# cryptography.exceptions.InvalidTag if it was tampered with
+def decrypt_stream(private_key, source, destination):
+    header = _read(source, HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError('Truncated envelope')
+    magic, chunk_size, prefix, count = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('Not an envelope')
+
+    own_id = recipient_id(private_key.public_key())
+    wrapped_key = None
+    for _ in range(count):
+        entry = _read(source, RECIPIENT.size)
+        if len(entry) < RECIPIENT.size:
+            raise ValueError('Truncated envelope')
+        key_id, length = RECIPIENT.unpack(entry)
+        wrapped = _read(source, length)
+        header += entry + wrapped
+        if key_id == own_id:
+            wrapped_key = wrapped
+    if wrapped_key is None:
+        raise ValueError('Envelope is not addressed to this key')
+
+    aesgcm = AESGCM(private_key.decrypt(wrapped_key, OAEP))
+    index = 0
+    chunk = _read(source, chunk_size + TAG_SIZE)
+    while True:
+        following = _read(source, chunk_size + TAG_SIZE) if len(chunk) == chunk_size + TAG_SIZE else b''
+        last = not following
+        destination.write(aesgcm.decrypt(_nonce(prefix, index, last), chunk, header))
+        if last:
+            return
+        chunk = following
+        index += 1
+
+
+# Encrypt a bytes payload for one public key or a list of them and return the envelope
+def encrypt(public_keys, data, chunk_size=DEFAULT_CHUNK_SIZE):
+    destination = io.BytesIO()
+    encrypt_stream(public_keys, io.BytesIO(data), destination, chunk_size)
+    return destination.getvalue()
+
+
+# Decrypt an envelope with a private key and return the payload
+def decrypt(private_key, envelope):
+    destination = io.BytesIO()
+    decrypt_stream(private_key, io.BytesIO(envelope), destination)
+    return destination.getvalue()
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import threading
+
+from cryptography.hazmat.primitives import serialization
+
+from wallet import public_keys, sign, verify
+
+# Number of independently locked shards the balances are spread over
+DEFAULT_SHARDS = 64
+
+# Length in bytes of an address id (40 hex characters)
+ADDRESS_SIZE = 20
+
+
+# Return the compact address id of a wallet: the hex of the first ADDRESS_SIZE bytes of the SHA-256 of its
+# public key in DER form
+def address_id(public_key_pem):
+    der = public_keys.load(public_key_pem).public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(der).digest()[:ADDRESS_SIZE].hex()
+
+
+# The string a sender signs to authorize a transfer
+# The fields are encoded as a JSON array, so no two different transfers sign the same string, and the
+# sender's sequence number makes every signed transfer usable only once
+def transfer_message(sender, recipient, amount, sequence):
+    return json.dumps([sender, recipient, amount, sequence], separators=(',', ':'))
+
+
+# Build a transfer from one address to another, signed with the sender's private key
+# sequence must be higher than that of every earlier transfer of the sender (see Ledger.next_sequence)
+def make_transfer(private_key_pem, sender, recipient, amount, sequence):
+    return {
+        'sender': sender,
+        'recipient': recipient,
+        'amount': amount,
+        'sequence': sequence,
+        'signature': sign(private_key_pem, transfer_message(sender, recipient, amount, sequence)),
+    }
+
+
+# One lock, and the balances and last used sequence numbers of the addresses that hash to it
+class Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.balances = {}
+        self.sequences = {}
+
+
+# Wallet balances keyed by address id, safe to use from many threads
+# Balances are spread over shards with a lock each, so batches touching different wallets do not wait for
+# each other; a batch locks the shards of all its wallets (always in shard order, so batches cannot deadlock)
+# and either applies every transfer or none of them
+class Ledger:
+    # service (a wallet.WalletService) verifies the signatures of a batch on its thread pool; without one they
+    # are verified on the calling thread
+    def __init__(self, shards=DEFAULT_SHARDS, service=None):
+        self.shards = [Shard() for _ in range(shards)]
+        self.service = service
+        # Public key PEM of every registered address
+        self.keys = {}
+
+    def _shard(self, address):
+        return self.shards[hash(address) % len(self.shards)]
+
+    # Register a wallet by its public key PEM and return its address id
+    def register(self, public_key_pem):
+        address = address_id(public_key_pem)
+        self.keys[address] = public_key_pem
+        return address
+
+    # Add an amount to a wallet, e.g. a mining reward
+    def deposit(self, address, amount):
+        shard = self._shard(address)
+        with shard.lock:
+            shard.balances[address] = shard.balances.get(address, 0) + amount
+
+    # Return the balance of a wallet (0 for an address that never received anything)
+    def balance(self, address):
+        shard = self._shard(address)
+        with shard.lock:
+            return shard.balances.get(address, 0)
+
+    # Return the lowest sequence number the next transfer of a wallet can use
+    def next_sequence(self, address):
+        shard = self._shard(address)
+        with shard.lock:
+            return shard.sequences.get(address, 0) + 1
+
+    # Return the sum of all balances; only meaningful while no batch is being applied
+    def total(self):
+        return sum(sum(shard.balances.values()) for shard in self.shards)
+
+    # Apply a single signed transfer and return its result (see apply_batch)
+    def transfer(self, transfer):
+        return self.apply_batch([transfer])[0]
+
+    # Apply a batch of signed transfers atomically: if every transfer is valid and every sender can pay
+    # (transfers are applied in order, so a wallet may spend what an earlier transfer of the batch gave it)
+    # all of them are applied, otherwise none is
+    # Each transfer's sequence number must be higher than the sender's last accepted one (gaps are allowed);
+    # it is checked and recorded under the same locks as the debit, so a replayed transfer is always rejected
+    # Return one result per transfer: {'accepted': True} or {'accepted': False, 'error': ...}; when a batch
+    # is rejected the transfers that were not at fault report 'Batch rejected'
+    def apply_batch(self, transfers):
+        errors = self._check(transfers)
+
+        if not any(errors):
+            count = len(self.shards)
+            shards = [self.shards[i] for i in sorted({hash(address) % count for t in transfers
+                                                      for address in (t['sender'], t['recipient'])})]
+            for shard in shards:
+                shard.lock.acquire()
+            try:
+                balances = {}
+                sequences = {}
+                for i, t in enumerate(transfers):
+                    for address in (t['sender'], t['recipient']):
+                        if address not in balances:
+                            balances[address] = self._shard(address).balances.get(address, 0)
+                    sender = t['sender']
+                    if sender not in sequences:
+                        sequences[sender] = self._shard(sender).sequences.get(sender, 0)
+                    if t['sequence'] <= sequences[sender]:
+                        errors[i] = 'Stale sequence'
+                        break
+                    if balances[sender] < t['amount']:
+                        errors[i] = 'Insufficient funds'
+                        break
+                    sequences[sender] = t['sequence']
+                    balances[sender] -= t['amount']
+                    balances[t['recipient']] += t['amount']
+                else:
+                    for address, balance in balances.items():
+                        self._shard(address).balances[address] = balance
+                    for address, sequence in sequences.items():
+                        self._shard(address).sequences[address] = sequence
+            finally:
+                for shard in shards:
+                    shard.lock.release()
+
+        if not any(errors):
+            return [{'accepted': True} for _ in transfers]
+        return [{'accepted': False, 'error': error or 'Batch rejected'} for error in errors]
+
+    # Check the fields and signatures of a batch without touching the balances
+    # Return one error message (or None) per transfer
+    def _check(self, transfers):
+        errors = [None] * len(transfers)
+        to_verify = []
+        positions = []
+        for i, t in enumerate(transfers):
+            amount = t.get('amount')
+            sequence = t.get('sequence')
+            if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+                errors[i] = 'Invalid amount'
+            elif not isinstance(sequence, int) or isinstance(sequence, bool) or sequence <= 0:
+                errors[i] = 'Invalid sequence'
+            elif t.get('sender') not in self.keys or not isinstance(t.get('recipient'), str):
+                errors[i] = 'Unknown address'
+            else:
+                message = transfer_message(t['sender'], t['recipient'], amount, sequence)
+                to_verify.append((self.keys[t['sender']], message, t.get('signature')))
+                positions.append(i)
+
+        if self.service is not None:
+            valid = self.service.verify_many(to_verify)
+        else:
+            valid = [verify(*item) for item in to_verify]
+        for i, ok in zip(positions, valid):
+            if not ok:
+                errors[i] = 'Invalid signature'
+        return errors
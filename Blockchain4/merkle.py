@@ -0,0 +1,343 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of nodes hashed by one task when a tree level is split across threads
+BULK_CHUNK_SIZE = 8192
+
+
+# Hash a transaction into a leaf of the tree (hex digest, as in calculate_merkle_root)
+def hash_leaf(transaction):
+    return hashlib.sha256(transaction.encode()).hexdigest()
+
+
+# Hash two neighbouring nodes into their parent by concatenating their hex digests
+def hash_pair(left, right):
+    return hashlib.sha256((left + right).encode()).hexdigest()
+
+
+# Return the number of levels above the leaves of a tree with leaf_count leaves (the length of an audit path)
+def tree_depth(leaf_count):
+    depth = 0
+    while leaf_count > 1:
+        leaf_count = (leaf_count + 1) // 2
+        depth += 1
+    return depth
+
+
+# Merkle tree that keeps every level, so changing a transaction only re-hashes its path to the root
+# The root is the same as calculate_merkle_root gives for the same list of transactions: an odd last node
+# is paired with itself, and a single transaction is its own root
+# levels[0] holds the leaf hashes and levels[-1] the root hash
+class MerkleTree:
+    def __init__(self, transactions=()):
+        self.transactions = list(transactions)
+        self.levels = [[hash_leaf(tx) for tx in self.transactions]]
+        self._rehash(0, len(self.transactions) - 1)
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def __contains__(self, transaction):
+        return transaction in self.transactions
+
+    def __iter__(self):
+        return iter(self.transactions)
+
+    # Return the position of the first occurrence of a transaction (raises ValueError if absent, like list.index)
+    def index(self, transaction):
+        return self.transactions.index(transaction)
+
+    # Return the Merkle root, or None for an empty tree
+    def root(self):
+        if not self.transactions:
+            return None
+        if len(self.transactions) == 1:
+            return self.transactions[0]
+        return self.levels[-1][0]
+
+    # Add a transaction at the end of the tree
+    def append(self, transaction):
+        self.transactions.append(transaction)
+        self.levels[0].append(hash_leaf(transaction))
+        index = len(self.transactions) - 1
+        self._rehash(index, index)
+
+    # Replace the transaction at the given position
+    def update(self, index, transaction):
+        self.transactions[index] = transaction
+        self.levels[0][index] = hash_leaf(transaction)
+        self._rehash(index, index)
+
+    # Remove and return the last transaction
+    def pop(self):
+        transaction = self.transactions.pop()
+        self.levels[0].pop()
+        index = len(self.transactions) - 1
+        self._rehash(index, index)
+        return transaction
+
+    # Remove the first occurrence of a transaction, keeping the order of the others (like list.remove)
+    # Every leaf after it moves one place to the left, so their paths have to be re-hashed; removing
+    # the last transaction costs only one path
+    def remove(self, transaction):
+        index = self.transactions.index(transaction)
+        del self.transactions[index]
+        del self.levels[0][index]
+        self._rehash(index, len(self.transactions) - 1)
+
+    # Return the audit path of the leaf at the given position: the sibling hash on every level from the leaf up
+    # Which side each sibling is on follows from the position, so the path does not carry it
+    # A last node without a sibling is paired with itself, so its own hash is the sibling
+    def proof(self, index):
+        path = []
+        for nodes in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling >= len(nodes):
+                sibling = index
+            path.append(nodes[sibling])
+            index //= 2
+        return path
+
+    # Return the audit paths of many leaves, keyed by position
+    def proofs(self, indices):
+        return {index: self.proof(index) for index in indices}
+
+    # Return one combined proof for many leaves: the (level, position, hash) of every node needed to recompute
+    # the root from those leaves
+    # Nodes that can be computed from the given leaves themselves are left out, so leaves that share
+    # part of their path share the nodes of it too
+    def multiproof(self, indices):
+        nodes = []
+        known = set(indices)
+        for level, hashes in enumerate(self.levels[:-1]):
+            for index in sorted(known):
+                sibling = index ^ 1
+                if sibling < len(hashes) and sibling not in known:
+                    nodes.append((level, sibling, hashes[sibling]))
+            known = {index // 2 for index in known}
+        return nodes
+
+    # Recompute the parents of the leaves lo..hi on every level up to the root
+    # Levels that became shorter are trimmed and levels above the new root are dropped
+    def _rehash(self, lo, hi):
+        lo = max(lo, 0)
+        level = 0
+        while len(self.levels[level]) > 1:
+            nodes = self.levels[level]
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            parents = self.levels[level + 1]
+
+            count = (len(nodes) + 1) // 2
+            del parents[count:]
+            lo, hi = lo // 2, min(hi // 2, count - 1)
+            for i in range(lo, hi + 1):
+                left = nodes[2 * i]
+                right = nodes[2 * i + 1] if 2 * i + 1 < len(nodes) else left
+                if i < len(parents):
+                    parents[i] = hash_pair(left, right)
+                else:
+                    parents.append(hash_pair(left, right))
+            level += 1
+        del self.levels[level + 1:]
+
+
+# Check an audit path (see MerkleTree.proof) for the transaction at position index of a tree with leaf_count
+# leaves against a Merkle root, without the other transactions of the block
+# The path must have exactly one hash per level of such a tree, and the side of each sibling is worked out
+# from the position, so a path cannot be shortened to start from an internal node or reordered
+# A one-transaction tree has the transaction itself as its root and an empty path
+def verify_proof(transaction, index, leaf_count, path, root):
+    if not 0 <= index < leaf_count or len(path) != tree_depth(leaf_count):
+        return False
+    if leaf_count == 1:
+        return transaction == root
+
+    node = hash_leaf(transaction)
+    width = leaf_count
+    for sibling in path:
+        if index % 2:
+            node = hash_pair(sibling, node)
+        elif index + 1 < width:
+            node = hash_pair(node, sibling)
+        elif sibling == node:
+            # The last node of an odd level is paired with itself
+            node = hash_pair(node, node)
+        else:
+            return False
+        index //= 2
+        width = (width + 1) // 2
+    return node == root
+
+
+# Check a combined proof (see MerkleTree.multiproof) for several transactions against a Merkle root
+# leaves maps the position of each transaction to the transaction; leaf_count is the size of the tree
+def verify_multiproof(leaves, nodes, leaf_count, root):
+    if not leaves or any(not 0 <= index < leaf_count for index in leaves):
+        return False
+    if leaf_count == 1:
+        return list(leaves.items()) == [(0, root)]
+
+    given = {(level, index): node for level, index, node in nodes}
+    current = {index: hash_leaf(transaction) for index, transaction in leaves.items()}
+    width = leaf_count
+    level = 0
+    while width > 1:
+        parents = {}
+        for index in current:
+            parent = index // 2
+            if parent in parents:
+                continue
+            left = current.get(2 * parent, given.get((level, 2 * parent)))
+            if 2 * parent + 1 < width:
+                right = current.get(2 * parent + 1, given.get((level, 2 * parent + 1)))
+            else:
+                right = left
+            if left is None or right is None:
+                return False
+            parents[parent] = hash_pair(left, right)
+        current = parents
+        width = (width + 1) // 2
+        level += 1
+    return current.get(0) == root
+
+
+# Hash the transactions first..last-1 into leaves, returned as one contiguous bytes buffer
+# compat=True stores each digest as its 64 ASCII hex characters (the calculate_merkle_root scheme, where a
+# parent hashes the concatenated hex of its children); compat=False stores the raw 32-byte digests
+def _hash_leaves(first, last, transactions, compat):
+    sha256 = hashlib.sha256
+    if compat:
+        return b''.join([sha256(tx.encode()).hexdigest().encode() for tx in transactions[first:last]])
+    return b''.join([sha256(tx.encode()).digest() for tx in transactions[first:last]])
+
+
+# Hash the parents first..last-1 of a level (an even number of nodes of node_size bytes) into one buffer
+# A parent's children are next to each other in the level buffer, so its input is a single slice of it
+def _hash_parents(first, last, level, node_size, compat):
+    sha256 = hashlib.sha256
+    step = 2 * node_size
+    positions = range(first * step, last * step, step)
+    if compat:
+        return b''.join([sha256(level[i:i + step]).hexdigest().encode() for i in positions])
+    return b''.join([sha256(level[i:i + step]).digest() for i in positions])
+
+
+# Run fn(first, last, *args) over [0, count) in chunks of BULK_CHUNK_SIZE, on the executor if there is one,
+# and join the returned buffers in order
+def _run_chunked(executor, fn, count, *args):
+    ranges = [(first, min(first + BULK_CHUNK_SIZE, count)) for first in range(0, count, BULK_CHUNK_SIZE)]
+    if executor is None or len(ranges) == 1:
+        return b''.join([fn(first, last, *args) for first, last in ranges])
+    futures = [executor.submit(fn, first, last, *args) for first, last in ranges]
+    return b''.join([future.result() for future in futures])
+
+
+# Compute the Merkle root of a large list of transactions level by level
+# Every level is kept as one contiguous buffer of digests and hashed in chunks on a pool of worker threads
+# compat=True gives exactly the root of calculate_merkle_root (hex-concatenation scheme, the transaction
+# itself for a single transaction); compat=False hashes the raw 32-byte digests of the children instead,
+# which halves the bytes hashed per node, and returns the hex of the raw root
+# workers=1 hashes everything on the calling thread
+# Note: CPython's hashlib only releases the GIL for inputs of 2 KiB or more, so how well the threads scale with
+# these small nodes depends on the interpreter (free-threaded builds hash in parallel); raw mode hashes half
+# the bytes either way
+def build_merkle_root(transactions, compat=True, workers=None):
+    if not transactions:
+        return None
+    if compat and len(transactions) == 1:
+        return transactions[0]
+
+    node_size = 64 if compat else 32
+    workers = workers or os.cpu_count() or 1
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        count = len(transactions)
+        level = _run_chunked(executor, _hash_leaves, count, transactions, compat)
+
+        while count > 1:
+            if count % 2:
+                # Pair an odd last node with itself
+                level += level[-node_size:]
+                count += 1
+            count //= 2
+            level = _run_chunked(executor, _hash_parents, count, level, node_size, compat)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return level.decode() if compat else level.hex()
+
+
+# Merkle root builder that takes transactions one at a time and keeps only one pending hash per tree level
+# (O(log n) memory), for inputs too large to hold in a list
+# The root is the same as calculate_merkle_root gives for the same transactions in the same order
+class StreamingMerkle:
+    def __init__(self):
+        self.pending = []
+        self.count = 0
+        self.first = None
+        # Highest level any node has reached so far
+        self.top = 0
+
+    # Add the next transaction; a node is combined with the pending node of its level as soon as it has one
+    def add(self, transaction):
+        if self.count == 0:
+            self.first = transaction
+        self.count += 1
+
+        node = hash_leaf(transaction)
+        level = 0
+        while level < len(self.pending) and self.pending[level] is not None:
+            node = hash_pair(self.pending[level], node)
+            self.pending[level] = None
+            level += 1
+        if level == len(self.pending):
+            self.pending.append(None)
+        self.pending[level] = node
+        self.top = max(self.top, level)
+
+    # Add every transaction of an iterable
+    def update(self, transactions):
+        for transaction in transactions:
+            self.add(transaction)
+
+    # Return the Merkle root of the transactions added so far (None if there are none)
+    # Going up from the leaves, the node carried up from below is the last node of its level: it is paired
+    # with the pending node of that level if there is one, and otherwise with itself, unless it is the only
+    # node of the highest level, i.e. the root
+    def root(self):
+        if self.count == 0:
+            return None
+        if self.count == 1:
+            return self.first
+
+        carry = None
+        top = self.top
+        for level in range(len(self.pending) + 1):
+            node = self.pending[level] if level < len(self.pending) else None
+            if node is not None and carry is not None:
+                carry = hash_pair(node, carry)
+            else:
+                last = node if node is not None else carry
+                if last is None:
+                    continue
+                if level >= top:
+                    return last
+                carry = hash_pair(last, last)
+            top = max(top, level + 1)
+        return carry
+
+
+# Compute the Merkle root of an iterable (for example a generator) of transactions without holding them
+def stream_merkle_root(transactions):
+    builder = StreamingMerkle()
+    builder.update(transactions)
+    return builder.root()
+
+
+# Compute the Merkle root of a file with one transaction per line, reading it line by line
+def merkle_root_from_file(path, encoding='utf-8'):
+    with open(path, encoding=encoding) as transactions:
+        return stream_merkle_root(line.rstrip('\n') for line in transactions)
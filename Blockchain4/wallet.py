@@ -0,0 +1,106 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+# Number of parsed keys kept per cache; the least recently used key is dropped first
+KEY_CACHE_SIZE = 4096
+
+# Signature algorithm of the SECP256K1 wallets (see create_wallet)
+ECDSA_SHA256 = ec.ECDSA(hashes.SHA256())
+
+
+# LRU cache of parsed key objects, keyed by the SHA-256 of their PEM encoding
+# sign and verify take PEM strings, so a wallet that signs many transactions parses its key only once
+class KeyCache:
+    def __init__(self, loader, maxsize=KEY_CACHE_SIZE):
+        self.loader = loader
+        self.maxsize = maxsize
+        self.keys = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Return the key object for a PEM (bytes or str), parsing it only if it is not cached
+    def load(self, pem):
+        if isinstance(pem, str):
+            pem = pem.encode()
+        digest = hashlib.sha256(pem).digest()
+
+        with self.lock:
+            key = self.keys.get(digest)
+            if key is not None:
+                self.keys.move_to_end(digest)
+                return key
+
+        key = self.loader(pem)
+
+        with self.lock:
+            self.keys[digest] = key
+            if len(self.keys) > self.maxsize:
+                self.keys.popitem(last=False)
+        return key
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+
+
+def _load_private_key(pem):
+    return serialization.load_pem_private_key(pem, password=None)
+
+
+private_keys = KeyCache(_load_private_key)
+public_keys = KeyCache(serialization.load_pem_public_key)
+
+
+# Sign a transaction string with a PEM private key, using the shared key cache
+def sign(private_key_pem, transaction):
+    return private_keys.load(private_key_pem).sign(transaction.encode(), ECDSA_SHA256)
+
+
+# Check the signature of a transaction string against a PEM public key, using the shared key cache
+# A key that cannot be parsed counts as a failed verification, like a wrong signature
+def verify(public_key_pem, transaction, signature):
+    try:
+        public_keys.load(public_key_pem).verify(signature, transaction.encode(), ECDSA_SHA256)
+        return True
+    except (InvalidSignature, ValueError, TypeError):
+        return False
+
+
+# Signs and verifies batches of wallet transactions on a pool of threads
+# OpenSSL releases the GIL during the elliptic-curve operations, so the batch runs in parallel
+# workers=1 runs every batch on the calling thread
+class WalletService:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+
+    # Sign a list of (private key PEM, transaction) pairs and return the signatures in the same order
+    def sign_many(self, items):
+        return self._map(sign, items)
+
+    # Verify a list of (public key PEM, transaction, signature) triples and return one bool per triple
+    def verify_many(self, items):
+        return self._map(verify, items)
+
+    def _map(self, fn, items):
+        if self.pool is None:
+            return [fn(*item) for item in items]
+        # One task per worker rather than one per item keeps the scheduling overhead off the fast path
+        items = list(items)
+        size = -(-len(items) // self.workers) or 1
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        futures = [self.pool.submit(lambda chunk: [fn(*item) for item in chunk], chunk) for chunk in chunks]
+        return [result for future in futures for result in future.result()]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -1,9 +1,14 @@
 import hashlib
+import struct
 import time
 import random
 
 
+# Transactions and blocks use __slots__ instead of a per-object __dict__, and a transaction keeps its hash as
+# 32 raw bytes (digest; transaction_hash gives the hex); to_dict() / from_dict() convert them to plain dicts
 class Transaction:
+    __slots__ = ('sender', 'recipient', 'amount', 'timestamp', 'fee', 'message', 'digest')
+
     def __init__(self, sender, recipient, amount, timestamp=None, fee=0, message=None):
         self.sender = sender
         self.recipient = recipient
@@ -11,20 +16,92 @@ class Transaction:
         self.timestamp = timestamp or time.time()
         self.fee = fee
         self.message = message  # User-defined message
-        self.transaction_hash = self.compute_transaction_hash()
+        self.digest = self.compute_digest()
 
-    def compute_transaction_hash(self):
+    @property
+    def transaction_hash(self):
+        return self.digest.hex()
+
+    def compute_digest(self):
         return hashlib.sha256(
-            f"{self.sender}{self.recipient}{self.amount}{self.timestamp}{self.fee}{self.message}".encode()).hexdigest()
+            f"{self.sender}{self.recipient}{self.amount}{self.timestamp}{self.fee}{self.message}".encode()).digest()
+
+    def compute_transaction_hash(self):
+        return self.compute_digest().hex()
+
+    def to_dict(self):
+        return {
+            'sender': self.sender,
+            'recipient': self.recipient,
+            'amount': self.amount,
+            'timestamp': self.timestamp,
+            'fee': self.fee,
+            'message': self.message,
+            'transaction_hash': self.transaction_hash,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        transaction = cls(data['sender'], data['recipient'], data['amount'], data['timestamp'], data['fee'],
+                          data['message'])
+        if transaction.transaction_hash != data['transaction_hash']:
+            raise ValueError("Transaction hash does not match its fields")
+        return transaction
 
 
 class Block:
-    def __init__(self, previous_hash, transactions, proof, timestamp=None, creator=None):
+    # In the order the attributes used to be set, so fields() is what __dict__ used to be
+    __slots__ = ('timestamp', 'previous_hash', 'transactions', 'proof', 'creator', 'version', 'merkle_root')
+
+    def __init__(self, previous_hash, transactions, proof, timestamp=None, creator=None, version=2):
         self.timestamp = timestamp or time.time()
         self.previous_hash = previous_hash
         self.transactions = transactions
         self.proof = proof
         self.creator = creator
+        self.version = version  # 1: hashed as str(fields()), 2: hashed over a binary header
+        self.merkle_root = merkle_root([tx.digest for tx in transactions]) if version >= 2 else None
+
+    # The attributes as a dict
+    def fields(self):
+        return {name: getattr(self, name) for name in Block.__slots__}
+
+    # The attributes a block had before versions existed, in their original order: exactly what block.__dict__
+    # gave then, and what version 1 blocks are hashed over
+    def legacy_fields(self):
+        return {
+            'timestamp': self.timestamp,
+            'previous_hash': self.previous_hash,
+            'transactions': self.transactions,
+            'proof': self.proof,
+            'creator': self.creator,
+        }
+
+    def to_dict(self):
+        data = self.fields()
+        data['transactions'] = [tx.to_dict() for tx in self.transactions]
+        data['merkle_root'] = self.merkle_root.hex() if self.merkle_root is not None else None
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        block = cls(data['previous_hash'], [Transaction.from_dict(tx) for tx in data['transactions']],
+                    data['proof'], data['timestamp'], data['creator'], data['version'])
+        if block.merkle_root is not None and block.merkle_root.hex() != data['merkle_root']:
+            raise ValueError("Merkle root does not match the transactions")
+        return block
+
+
+def merkle_root(transaction_digests):
+    # Merkle root (raw bytes) over the raw transaction digests; an odd last node is paired with itself
+    if not transaction_digests:
+        return bytes(32)
+    level = list(transaction_digests)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0]
 
 
 class SmartContract:
@@ -44,13 +121,24 @@ class Node:
         self.address = hashlib.sha256(str(node_id).encode()).hexdigest()
 
 
+# Hash of Block("1", [], 0, timestamp=1700000000.0, creator="Genesis Node") as computed before block versions
+LEGACY_GENESIS_HASH = "a470d51604a85eff89a04840a482bfd7ebc8e208d48b9aa8e1c1f5de9ac0d18a"
+
+
 def hash(block):
-    return hashlib.sha256(str(block.__dict__).encode()).hexdigest()
+    if block.version == 1:
+        return hashlib.sha256(str(block.legacy_fields()).encode()).hexdigest()
+    # Version 2: version, timestamp, previous hash and Merkle root packed into 73 bytes, followed by the
+    # proof (an int for PoW, a float for PoS) and the creator
+    header = struct.pack(">Bd32s32s", block.version, block.timestamp,
+                         int(block.previous_hash, 16).to_bytes(32, "big"), block.merkle_root)
+    header += f"{block.proof}|{block.creator}".encode()
+    return hashlib.sha256(header).hexdigest()
 
 
 class EthereumBlockchain:
     def __init__(self, block_size_limit=5, transaction_fee_rate=0.1,
-                 stake_multiplier=0.1, default_stake=50):
+                 stake_multiplier=0.1, default_stake=50, difficulty_bits=16):
         self.chain = []
         self.pending_transactions = []
         self.smart_contracts = []
@@ -60,6 +148,8 @@ class EthereumBlockchain:
         self.default_stake = default_stake
         self.nodes = []
         self.seen_transactions = set()  # Set to track already seen transactions
+        # Proof-of-Work target as a 256-bit integer; 16 leading zero bits is the "0000" hex prefix
+        self.target = (1 << (256 - difficulty_bits)) - 1
 
     def create_genesis_block(self):
         genesis_block = Block(previous_hash="1", transactions=[], proof=0, creator="Genesis Node")
@@ -80,12 +170,12 @@ class EthereumBlockchain:
                                   fee=self.calculate_transaction_fee(amount))
 
         # Prevent double spending
-        if transaction.transaction_hash in self.seen_transactions:
+        if transaction.digest in self.seen_transactions:
             print(f"Transaction {transaction.transaction_hash} already processed (Double Spending detected).")
             return
 
         self.pending_transactions.append(transaction)
-        self.seen_transactions.add(transaction.transaction_hash)  # Add transaction hash to seen set
+        self.seen_transactions.add(transaction.digest)  # Add transaction hash to seen set
 
         sender.balance -= amount + transaction.fee
         recipient.balance += amount
@@ -97,7 +187,7 @@ class EthereumBlockchain:
             last_proof = last_block.proof
             proof = self.proof_of_work(last_proof)
             block = self.create_block(proof)
-            print(f"Block mined with Proof-of-Work: {block.__dict__}")
+            print(f"Block mined with Proof-of-Work: {block.to_dict()}")
             return block
         elif consensus == "pos":
             creator = self.select_block_creator()
@@ -105,20 +195,25 @@ class EthereumBlockchain:
             last_proof = hash(last_block)
             proof = self.proof_of_stake(last_proof, creator)
             block = self.create_block(proof)
-            print(f"Block mined with Proof-of-Stake: {block.__dict__}")
+            print(f"Block mined with Proof-of-Stake: {block.to_dict()}")
             return block
 
     def proof_of_work(self, last_proof):
+        # Hash the constant last_proof prefix once and copy the hasher state for each candidate proof;
+        # the raw digest is compared with the target's big-endian bytes, which orders them like integers
+        target_bytes = self.target.to_bytes(32, "big")
+        prefix = hashlib.sha256(f"{last_proof}".encode())
         proof = 0
-        while self.valid_proof(last_proof, proof) is False:
+        while True:
+            guess = prefix.copy()
+            guess.update(str(proof).encode())
+            if guess.digest() <= target_bytes:
+                return proof
             proof += 1
-        return proof
 
-    @staticmethod
-    def valid_proof(last_proof, proof):
+    def valid_proof(self, last_proof, proof):
         guess = f"{last_proof}{proof}".encode()
-        guess_hash = hashlib.sha256(guess).hexdigest()
-        return guess_hash[:4] == "0000"
+        return hashlib.sha256(guess).digest() <= self.target.to_bytes(32, "big")
 
     def proof_of_stake(self, last_proof, creator):
         selected_node = self.get_node_by_id(creator)
@@ -170,48 +265,51 @@ def amount_threshold_action(transaction):
     print(f"Warning: Large transaction amount detected! Amount: {transaction.amount}")
 
 
-# Example Usage:
-ethereum = EthereumBlockchain()
-ethereum.create_genesis_block()
-
-# Create Nodes
-alice = Node("Alice", balance=200)
-bob = Node("Bob", balance=150)
+# Viewing Wallet Balances
+def view_wallet_balances(blockchain):
+    for node in blockchain.get_all_nodes():
+        print(f"Node {node.node_id} ({node.address}) balance: {node.balance}")
 
-# Add nodes to the blockchain
-ethereum.nodes.extend([alice, bob])
 
-# Transactions
-tx1 = ethereum.create_transaction(alice, bob, 50)
-tx2 = ethereum.create_transaction(bob, alice, 30)
-tx3 = ethereum.create_transaction(alice, bob, 150)  # Large transaction to trigger smart contract
+# Block Explorer
+def block_explorer(blockchain):
+    for i, block in enumerate(blockchain.chain):
+        print(f"\nBlock {i}: {block.to_dict()}")
 
-# Create and execute smart contracts for high fee and large transaction amount
-high_fee_contract = SmartContract(fee_threshold_condition, fee_threshold_action)
-high_fee_contract.execute(tx1)
 
-large_amount_contract = SmartContract(amount_threshold_condition, amount_threshold_action)
-large_amount_contract.execute(tx3)
+# Example Usage:
+if __name__ == "__main__":
+    # Version 1 blocks must keep the hash they had before block versions were added
+    legacy_genesis = Block("1", [], 0, timestamp=1700000000.0, creator="Genesis Node", version=1)
+    assert hash(legacy_genesis) == LEGACY_GENESIS_HASH, "version 1 block hash changed"
 
-# Mine a Block using Proof-of-Work
-ethereum.mine_block(consensus="pow")
+    ethereum = EthereumBlockchain()
+    ethereum.create_genesis_block()
 
+    # Create Nodes
+    alice = Node("Alice", balance=200)
+    bob = Node("Bob", balance=150)
 
-# Viewing Wallet Balances
-def view_wallet_balances(blockchain):
-    for node in blockchain.get_all_nodes():
-        print(f"Node {node.node_id} ({node.address}) balance: {node.balance}")
+    # Add nodes to the blockchain
+    ethereum.nodes.extend([alice, bob])
 
+    # Transactions
+    tx1 = ethereum.create_transaction(alice, bob, 50)
+    tx2 = ethereum.create_transaction(bob, alice, 30)
+    tx3 = ethereum.create_transaction(alice, bob, 150)  # Large transaction to trigger smart contract
 
-# Viewing wallet balances
-view_wallet_balances(ethereum)
+    # Create and execute smart contracts for high fee and large transaction amount
+    high_fee_contract = SmartContract(fee_threshold_condition, fee_threshold_action)
+    high_fee_contract.execute(tx1)
 
+    large_amount_contract = SmartContract(amount_threshold_condition, amount_threshold_action)
+    large_amount_contract.execute(tx3)
 
-# Block Explorer
-def block_explorer(blockchain):
-    for i, block in enumerate(blockchain.chain):
-        print(f"\nBlock {i}: {block.__dict__}")
+    # Mine a Block using Proof-of-Work
+    ethereum.mine_block(consensus="pow")
 
+    # Viewing wallet balances
+    view_wallet_balances(ethereum)
 
-# Explore Blockchain
-block_explorer(ethereum)
+    # Explore Blockchain
+    block_explorer(ethereum)
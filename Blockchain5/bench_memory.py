@@ -0,0 +1,71 @@
+import gc
+import tracemalloc
+from argparse import ArgumentParser
+
+from Blockchain5 import Block, Transaction
+
+
+# The record layout before __slots__: attributes in a per-object __dict__ and the transaction hash as hex
+class DictRecord:
+    pass
+
+
+# Copy transactions and blocks into the old layout and into the slotted types; every copy gets its own hash
+# object and shares all other field values with the originals
+def dict_transaction(t):
+    record = DictRecord()
+    record.sender, record.recipient, record.amount = t.sender, t.recipient, t.amount
+    record.timestamp, record.fee, record.message = t.timestamp, t.fee, t.message
+    record.transaction_hash = t.digest.hex()
+    return record
+
+
+def slot_transaction(t):
+    record = Transaction.__new__(Transaction)
+    record.sender, record.recipient, record.amount = t.sender, t.recipient, t.amount
+    record.timestamp, record.fee, record.message = t.timestamp, t.fee, t.message
+    record.digest = bytes.fromhex(t.digest.hex())
+    return record
+
+
+def copy_block(record, b):
+    record.timestamp, record.previous_hash, record.transactions = b.timestamp, b.previous_hash, b.transactions
+    record.proof, record.creator, record.version = b.proof, b.creator, b.version
+    record.merkle_root = bytes.fromhex(b.merkle_root.hex())
+    return record
+
+
+# Bytes allocated by build() per record it creates
+def bytes_per_record(build, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del records
+    return used / count
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--transactions', default=1000000, type=int, help='transactions held in memory')
+    parser.add_argument('-b', '--block-size', default=5, type=int, help='transactions per block')
+    args = parser.parse_args()
+
+    transactions = [Transaction(f'sender-{i % 100}', f'recipient-{i % 100}', i, fee=i * 0.1)
+                    for i in range(args.transactions)]
+    blocks = [Block('0' * 64, transactions[i:i + args.block_size], i, creator='Miner')
+              for i in range(0, len(transactions), args.block_size)]
+
+    rows = [
+        ('transaction', bytes_per_record(lambda: [dict_transaction(t) for t in transactions], len(transactions)),
+         bytes_per_record(lambda: [slot_transaction(t) for t in transactions], len(transactions))),
+        ('block (excluding transactions)',
+         bytes_per_record(lambda: [copy_block(DictRecord(), b) for b in blocks], len(blocks)),
+         bytes_per_record(lambda: [copy_block(Block.__new__(Block), b) for b in blocks], len(blocks))),
+    ]
+
+    print(f"{'bytes per':<32} {'__dict__':>9} {'__slots__':>10}")
+    for name, before, after in rows:
+        print(f"{name:<32} {before:>9.0f} {after:>10.0f}")
@@ -1,72 +1,306 @@
+import bisect
 import hashlib
+import json
+import threading
 import time
 from cryptography.fernet import Fernet
 
+# A block is sealed once this many transactions are waiting, or once the oldest has waited this many seconds
+DEFAULT_BLOCK_SIZE = 500
+DEFAULT_BLOCK_INTERVAL = 10.0
 
+
+def merkle_root(transaction_digests):
+    # Merkle root (hex) over the raw transaction digests; an odd last node is paired with itself
+    if not transaction_digests:
+        return '0' * 64
+    level = list(transaction_digests)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+# Caesar cipher key of encrypt_data
+CAESAR_KEY = 3
+
+
+# Translation table of the original character-by-character cipher: every letter c (anything isalpha() accepts,
+# including uppercase and non-ASCII letters) became chr((ord(c) + key - ord('a')) % 26 + ord('a')), so uppercase
+# letters came out as shifted lowercase ones
+# The entry of a character is computed the first time it is seen, since isalpha() covers all of Unicode
+class LegacyCaesarTable(dict):
+    def __init__(self, key):
+        super().__init__()
+        self.key = key
+
+    def __missing__(self, code):
+        if chr(code).isalpha():
+            value = (code + self.key - ord('a')) % 26 + ord('a')
+        else:
+            value = code
+        self[code] = value
+        return value
+
+
+# Caesar cipher over precomputed translation tables, applied to a whole string or byte buffer in one
+# str.translate / bytes.translate call
+# Lowercase and uppercase ASCII letters are each shifted within their own case and everything else is kept;
+# compat=True reproduces the original encrypt_data output instead (see LegacyCaesarTable), which is what
+# calculate_hash2 hashes. Byte buffers only have their ASCII letters shifted, in either mode
+class CaesarCipher:
+    def __init__(self, key=CAESAR_KEY, compat=False):
+        self.key = key
+        self.compat = compat
+        lower = 'abcdefghijklmnopqrstuvwxyz'
+        upper = lower.upper()
+        shifted_lower = lower[key % 26:] + lower[:key % 26]
+        shifted_upper = upper[key % 26:] + upper[:key % 26]
+
+        letters = lower + upper
+        if compat:
+            self.table = LegacyCaesarTable(key)
+            shifted = ''.join(chr(self.table[ord(c)]) for c in letters)
+        else:
+            shifted = shifted_lower + shifted_upper
+            self.table = str.maketrans(letters, shifted)
+            self.inverse_table = str.maketrans(shifted, letters)
+        self.byte_table = bytes.maketrans(letters.encode(), shifted.encode())
+
+    # Encrypt a string or a bytes-like buffer
+    def encrypt(self, data):
+        if isinstance(data, str):
+            return data.translate(self.table)
+        return bytes(data).translate(self.byte_table)
+
+    # Encrypt many strings or buffers at once and return the results in the same order
+    def encrypt_many(self, records):
+        table, byte_table = self.table, self.byte_table
+        return [record.translate(table) if isinstance(record, str) else bytes(record).translate(byte_table)
+                for record in records]
+
+    # Undo encrypt on a string (not possible in compat mode, which maps upper- and lowercase letters together)
+    def decrypt(self, text):
+        if self.compat:
+            raise ValueError('The compat cipher cannot be decrypted')
+        return text.translate(self.inverse_table)
+
+
+caesar = CaesarCipher(CAESAR_KEY)
+legacy_caesar = CaesarCipher(CAESAR_KEY, compat=True)
+
+
+# Caesar-encrypt the fields of many transactions at once (see Transaction.encrypt_data)
+def encrypt_transactions(transactions, compat=False):
+    return (legacy_caesar if compat else caesar).encrypt_many([t.field_string() for t in transactions])
+
+
+# Blocks, transactions and participants declare __slots__, so they carry no per-object __dict__; chains with
+# millions of transactions are held in memory. to_dict() and from_dict() convert them to and from plain dicts
+# (for JSON), since the objects themselves have no __dict__ to dump
 class Block:
-    def __init__(self, previous_hash, transactions):
-        self.timestamp = time.time()
+    __slots__ = ('timestamp', 'previous_hash', 'transactions', 'merkle_root', 'hash')
+
+    def __init__(self, previous_hash, transactions, timestamp=None):
+        self.timestamp = timestamp or time.time()
         self.previous_hash = previous_hash
         self.transactions = transactions
+        self.merkle_root = merkle_root([transaction.digest for transaction in transactions])
         self.hash = self.calculate_hash()
 
+    def to_dict(self):
+        return {
+            'timestamp': self.timestamp,
+            'previous_hash': self.previous_hash,
+            'transactions': [transaction.to_dict() for transaction in self.transactions],
+            'merkle_root': self.merkle_root,
+            'hash': self.hash,
+        }
+
+    # Rebuild a block from to_dict() output; raise ValueError if its hash does not match its contents
+    @classmethod
+    def from_dict(cls, data):
+        block = cls(data['previous_hash'], [Transaction.from_dict(t) for t in data['transactions']],
+                    data['timestamp'])
+        if block.merkle_root != data['merkle_root'] or block.hash != data['hash']:
+            raise ValueError('Block hash does not match its contents')
+        return block
+
+    # The block commits to its transactions through their Merkle root, so hashing it costs the same
+    # however many transactions it holds
     def calculate_hash(self):
-        data = str(self.timestamp) + str(self.previous_hash) + str(self.transactions)
+        data = str(self.timestamp) + str(self.previous_hash) + self.merkle_root
         return hashlib.sha256(data.encode()).hexdigest()
 
 
 class Transaction:
-    def __init__(self, sender, receiver, product, quantity, description=""):
-        self.timestamp = time.time()
+    # The hash is kept as its 32 raw bytes (digest); the hash property gives it as hex
+    __slots__ = ('timestamp', 'sender', 'receiver', 'product', 'quantity', 'description', 'digest',
+                 'encrypted_fields')
+
+    def __init__(self, sender, receiver, product, quantity, description="", timestamp=None):
+        self.timestamp = timestamp or time.time()
         self.sender = sender
         self.receiver = receiver
         self.product = product
         self.quantity = quantity
         self.description = description
-        self.hash = self.calculate_hash()
-
+        self.digest = hashlib.sha256(self.canonical_encoding()).digest()
+        self.encrypted_fields = None
+
+    @property
+    def hash(self):
+        return self.digest.hex()
+
+    def to_dict(self):
+        data = {
+            'timestamp': self.timestamp,
+            'sender': self.sender,
+            'receiver': self.receiver,
+            'product': self.product,
+            'quantity': self.quantity,
+            'description': self.description,
+            'hash': self.hash,
+        }
+        if self.encrypted_fields is not None:
+            data['encrypted_fields'] = self.encrypted_fields.decode()
+        return data
+
+    # Rebuild a transaction from to_dict() output; raise ValueError if its hash does not match its fields
+    @classmethod
+    def from_dict(cls, data):
+        transaction = cls(data['sender'], data['receiver'], data['product'], data['quantity'], data['description'],
+                          data['timestamp'])
+        if transaction.hash != data['hash']:
+            raise ValueError('Transaction hash does not match its fields')
+        if 'encrypted_fields' in data:
+            transaction.encrypted_fields = data['encrypted_fields'].encode()
+        return transaction
+
+    # Canonical encoding of the transaction fields: a compact JSON array, so field boundaries are unambiguous
+    # and the same transaction always encodes to the same bytes
+    def canonical_encoding(self):
+        return json.dumps([self.timestamp, str(self.sender), str(self.receiver), str(self.product),
+                           str(self.quantity), str(self.description)], separators=(',', ':')).encode()
+
+    # SHA-256 of the canonical encoding; deterministic, so a stored hash can be checked again (see verify_hash)
+    # Encrypting the fields is a separate step (see ParticipantKeyring) and does not change the hash
     def calculate_hash(self):
-        # Fernet symmetric key encryption (more secure than Caesar cipher)
-        key = Fernet.generate_key()
-        cipher_suite = Fernet(key)
+        return hashlib.sha256(self.canonical_encoding()).hexdigest()
 
-        encrypted_data = cipher_suite.encrypt(str(self.sender).encode() +
-                                              str(self.receiver).encode() +
-                                              str(self.product).encode() +
-                                              str(self.quantity).encode() +
-                                              str(self.description).encode())
+    # Recompute the hash and check it against the stored one
+    def verify_hash(self):
+        return self.hash == self.calculate_hash()
 
-        return hashlib.sha256(encrypted_data).hexdigest()
+    # Encrypt the canonical encoding with the sender's cipher from the keyring and return the Fernet token
+    def encrypt_fields(self, keyring):
+        return keyring.encrypt(self.sender, self.canonical_encoding())
 
     def calculate_hash2(self):
-        # Caesar cipher for basic encryption
-        encrypted_data = self.encrypt_data()
+        # Caesar cipher for basic encryption (the original cipher, so existing hashes stay the same)
+        encrypted_data = self.encrypt_data(compat=True)
         data = str(self.timestamp) + str(encrypted_data)
         return hashlib.sha256(data.encode()).hexdigest()
 
-    def encrypt_data(self):
-        key = 3  # Caesar cipher key
-        encrypted_data = ""
-        for char in str(self.sender) + str(self.receiver) + str(self.product) + str(self.quantity) + str(
-                self.description):
-            if char.isalpha():
-                encrypted_data += chr((ord(char) + key - ord('a')) % 26 + ord('a'))
-            else:
-                encrypted_data += char
-        return encrypted_data
+    # The transaction fields concatenated, as encrypted by encrypt_data
+    def field_string(self):
+        return str(self.sender) + str(self.receiver) + str(self.product) + str(self.quantity) + str(self.description)
+
+    # Caesar-encrypt the fields (see CaesarCipher); compat=True gives the output of the original cipher
+    def encrypt_data(self, compat=False):
+        return (legacy_caesar if compat else caesar).encrypt(self.field_string())
 
 
 class Participant:
+    __slots__ = ('participant_id', 'public_key')
+
     def __init__(self, participant_id, public_key):
         self.participant_id = participant_id
         self.public_key = public_key
 
+    def to_dict(self):
+        return {'participant_id': self.participant_id, 'public_key': self.public_key}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['participant_id'], data['public_key'])
+
+
+# Fernet keys of the participants, one cipher per participant created once and reused for every transaction
+class ParticipantKeyring:
+    def __init__(self):
+        self.ciphers = {}
+
+    # Set the key of a participant (a new random one if none is given) and return it
+    def add(self, participant_id, key=None):
+        key = key or Fernet.generate_key()
+        self.ciphers[participant_id] = Fernet(key)
+        return key
+
+    def cipher(self, participant_id):
+        if participant_id not in self.ciphers:
+            self.add(participant_id)
+        return self.ciphers[participant_id]
+
+    def encrypt(self, participant_id, data):
+        return self.cipher(participant_id).encrypt(data)
+
+    def decrypt(self, participant_id, token):
+        return self.cipher(participant_id).decrypt(token)
+
+
+# Locations (block index, position in the block) of transactions grouped by a key such as a product,
+# each group kept in timestamp order so a time window is found by bisection
+class TransactionIndex:
+    def __init__(self):
+        self.timestamps = {}
+        self.locations = {}
+
+    def add(self, key, timestamp, location):
+        timestamps = self.timestamps.setdefault(key, [])
+        locations = self.locations.setdefault(key, [])
+        # Transactions normally arrive in timestamp order, so this is an append
+        position = bisect.bisect_right(timestamps, timestamp)
+        timestamps.insert(position, timestamp)
+        locations.insert(position, location)
+
+    def count(self, key):
+        return len(self.timestamps.get(key, ()))
+
+    # Return the locations for a key with start <= timestamp <= end (either bound may be None), oldest first
+    def find(self, key, start=None, end=None):
+        timestamps = self.timestamps.get(key)
+        if not timestamps:
+            return []
+        lo = 0 if start is None else bisect.bisect_left(timestamps, start)
+        hi = len(timestamps) if end is None else bisect.bisect_right(timestamps, end)
+        return self.locations[key][lo:hi]
+
 
 class SupplyChainNode:
-    def __init__(self, node_id, admin_key):
+    # With encrypt_fields set, every transaction also keeps its fields encrypted with the sender's key
+    # (transaction.encrypted_fields)
+    # New transactions wait in the mempool and are sealed into one block when block_size of them are waiting,
+    # block_interval seconds after the first of them arrived, or when flush() is called
+    def __init__(self, node_id, admin_key, encrypt_fields=False, block_size=DEFAULT_BLOCK_SIZE,
+                 block_interval=DEFAULT_BLOCK_INTERVAL):
         self.node_id = node_id
         self.admin_key = admin_key
         self.participants = {}
+        self.keyring = ParticipantKeyring()
+        self.encrypt_fields = encrypt_fields
+        self.block_size = block_size
+        self.block_interval = block_interval
+        self.mempool = []
+        self.seal_timer = None
+        self.lock = threading.RLock()
+        # Where the transactions of every product, sender and receiver are in the chain, and all of them
+        # (under the key None of all_transactions)
+        self.by_product = TransactionIndex()
+        self.by_sender = TransactionIndex()
+        self.by_receiver = TransactionIndex()
+        self.all_transactions = TransactionIndex()
         self.chain = [self.create_genesis_block()]
 
     def create_genesis_block(self):
@@ -78,9 +312,70 @@ class SupplyChainNode:
             return
 
         transaction = Transaction(sender, receiver, product, quantity, description)
-        block = self.create_block([transaction])
+        if self.encrypt_fields:
+            transaction.encrypted_fields = transaction.encrypt_fields(self.keyring)
+
+        with self.lock:
+            self.mempool.append(transaction)
+            if len(self.mempool) >= self.block_size:
+                self._seal()
+            elif self.seal_timer is None:
+                self.seal_timer = threading.Timer(self.block_interval, self.flush)
+                self.seal_timer.daemon = True
+                self.seal_timer.start()
+        print("Transaction added to the mempool.")
+        return transaction
+
+    # Seal the waiting transactions into a block now and return it (None if the mempool is empty)
+    def flush(self):
+        with self.lock:
+            return self._seal()
+
+    def _seal(self):
+        if self.seal_timer is not None:
+            self.seal_timer.cancel()
+            self.seal_timer = None
+        if not self.mempool:
+            return None
+
+        block = self.create_block(self.mempool)
+        self.mempool = []
         self.chain.append(block)
-        print("Transaction added to the blockchain.")
+        self.index_block(len(self.chain) - 1, block)
+        return block
+
+    # Add the transactions of a block appended to the chain to the product, sender and receiver indexes
+    def index_block(self, block_index, block):
+        for position, transaction in enumerate(block.transactions):
+            location = (block_index, position)
+            self.by_product.add(transaction.product, transaction.timestamp, location)
+            self.by_sender.add(transaction.sender, transaction.timestamp, location)
+            self.by_receiver.add(transaction.receiver, transaction.timestamp, location)
+            self.all_transactions.add(None, transaction.timestamp, location)
+
+    def transaction_at(self, location):
+        block_index, position = location
+        return self.chain[block_index].transactions[position]
+
+    # Return the sealed transactions matching every given filter, oldest first: a product, a sender, a receiver
+    # and a timestamp window start <= timestamp <= end (either bound may be left out)
+    # The smallest of the matching indexes is read and the other filters are checked on its transactions
+    def find_transactions(self, product=None, sender=None, receiver=None, start=None, end=None):
+        filters = [(index, key) for index, key in ((self.by_product, product), (self.by_sender, sender),
+                                                   (self.by_receiver, receiver)) if key is not None]
+        if not filters:
+            filters = [(self.all_transactions, None)]
+        with self.lock:
+            index, key = min(filters, key=lambda f: f[0].count(f[1]))
+            transactions = [self.transaction_at(location) for location in index.find(key, start, end)]
+        return [t for t in transactions
+                if (product is None or t.product == product) and (sender is None or t.sender == sender)
+                and (receiver is None or t.receiver == receiver)]
+
+    # Return the custody path of a product: its sealed transactions in time order, each handing it from the
+    # sender to the receiver
+    def trace(self, product, start=None, end=None):
+        return self.find_transactions(product=product, start=start, end=end)
 
     def create_block(self, transactions):
         previous_hash = self.get_previous_hash()
@@ -89,6 +384,12 @@ class SupplyChainNode:
     def get_previous_hash(self):
         return self.chain[-1].hash if self.chain else "0"
 
+    # Recompute the hash of every transaction in the chain and return the ones whose stored hash does not match
+    # as (block index, transaction) pairs
+    def verify_transactions(self):
+        return [(idx, transaction) for idx, block in enumerate(self.chain) for transaction in block.transactions
+                if not transaction.verify_hash()]
+
     def add_participant(self, participant):
         if participant.participant_id not in self.participants:
             self.participants[participant.participant_id] = participant
@@ -109,12 +410,15 @@ class SupplyChainNode:
             print(f"Block {idx}:")
             print(f"  Timestamp: {time.ctime(block.timestamp)}")
             print(f"  Previous Hash: {block.previous_hash}")
+            print(f"  Merkle Root: {block.merkle_root}")
             print(f"  Hash: {block.hash}")
             print(f"  Transactions:")
             for transaction in block.transactions:
                 print(f"    Sender: {transaction.sender}, Receiver: {transaction.receiver}, Product: {transaction.product}")
                 print(f"    Quantity: {transaction.quantity}, Description: {transaction.description}")
                 print(f"    Timestamp: {time.ctime(transaction.timestamp)}, Hash: {transaction.hash}")
+        if self.mempool:
+            print(f"Pending transactions (not yet in a block): {len(self.mempool)}")
 
 
 # Command-line interface
@@ -130,9 +434,11 @@ def user_interface():
         print("2. Add Transaction")
         print("3. View Participants")
         print("4. View Blockchain")
-        print("5. Exit")
+        print("5. Seal Pending Transactions")
+        print("6. Trace Product")
+        print("7. Exit")
 
-        choice = input("Enter your choice (1-5): ")
+        choice = input("Enter your choice (1-7): ")
 
         if choice == "1":
             participant_id = input("Enter Participant ID: ")
@@ -155,6 +461,23 @@ def user_interface():
             supply_chain_node.view_blockchain()
 
         elif choice == "5":
+            block = supply_chain_node.flush()
+            if block is None:
+                print("No pending transactions.")
+            else:
+                print(f"Sealed a block with {len(block.transactions)} transaction(s).")
+
+        elif choice == "6":
+            product = input("Enter Product: ")
+            path = supply_chain_node.trace(product)
+            if not path:
+                print("No sealed transactions for this product.")
+            for transaction in path:
+                print(f"  {time.ctime(transaction.timestamp)}: {transaction.sender} -> {transaction.receiver}, "
+                      f"Quantity: {transaction.quantity}")
+
+        elif choice == "7":
+            supply_chain_node.flush()
             print("Exiting the Supply Chain Node CLI. Goodbye!")
             break
 
@@ -163,28 +486,32 @@ def user_interface():
 
 
 # Example Usage:
-# Create participants with unique public keys
-participant1 = Participant(participant_id="SupplierA", public_key="SUPPLIER_KEY")
-participant2 = Participant(participant_id="ManufacturerB", public_key="MANUFACTURER_KEY")
+def example_usage():
+    # Create participants with unique public keys
+    participant1 = Participant(participant_id="SupplierA", public_key="SUPPLIER_KEY")
+    participant2 = Participant(participant_id="ManufacturerB", public_key="MANUFACTURER_KEY")
+
+    # Instantiate the supply chain node with an admin key
+    supply_chain_node = SupplyChainNode(node_id="Node1", admin_key="ADMIN_KEY")
 
-# Instantiate the supply chain node with an admin key
-supply_chain_node = SupplyChainNode(node_id="Node1", admin_key="ADMIN_KEY")
+    # Add participants to the supply chain node
+    supply_chain_node.add_participant(participant1)
+    supply_chain_node.add_participant(participant2)
 
-# Add participants to the supply chain node
-supply_chain_node.add_participant(participant1)
-supply_chain_node.add_participant(participant2)
+    # Add a sample transaction to the blockchain
+    supply_chain_node.add_transaction(sender="SupplierA", receiver="ManufacturerB", product="RawMaterialX",
+                                      quantity=100, description="Initial supply")
 
-# Add a sample transaction to the blockchain
-supply_chain_node.add_transaction(sender="SupplierA", receiver="ManufacturerB", product="RawMaterialX", quantity=100,
-                                  description="Initial supply")
+    # Attempting to add a transaction with invalid participants
+    supply_chain_node.add_transaction(sender="NonexistentParticipant", receiver="ManufacturerB",
+                                      product="RawMaterialX", quantity=50, description="Invalid transaction")
 
-# Attempting to add a transaction with invalid participants
-supply_chain_node.add_transaction(sender="NonexistentParticipant", receiver="ManufacturerB", product="RawMaterialX",
-                                  quantity=50, description="Invalid transaction")
+    # Seal the pending transaction into a block and display the blockchain
+    supply_chain_node.flush()
+    supply_chain_node.view_blockchain()
 
-# Display the blockchain
-supply_chain_node.view_blockchain()
 
 # CLI Start:
 if __name__ == "__main__":
+    example_usage()
     user_interface()
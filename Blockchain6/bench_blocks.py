@@ -0,0 +1,41 @@
+import contextlib
+import os
+from argparse import ArgumentParser
+from time import perf_counter
+
+from BLOCKCHAIN6 import Participant, SupplyChainNode
+
+
+# Feed n shipment events through add_transaction and seal what is left
+# With block_size=1 every transaction is sealed into its own block, as add_transaction did before the mempool
+def feed(node, n):
+    for i in range(n):
+        node.add_transaction('SupplierA', 'ManufacturerB', f'Product{i % 100}', i, 'Shipment')
+    node.flush()
+
+
+def new_node(block_size):
+    node = SupplyChainNode('Node1', 'ADMIN_KEY', block_size=block_size, block_interval=3600)
+    for participant_id in ('SupplierA', 'ManufacturerB'):
+        node.add_participant(Participant(participant_id, participant_id + '_KEY'))
+    return node
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--transactions', default=100000, type=int, help='shipment events')
+    parser.add_argument('-b', '--block-size', default=500, type=int, help='transactions per sealed block')
+    args = parser.parse_args()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results = []
+        for name, block_size in (('one block per transaction', 1),
+                                 (f'mempool, {args.block_size} per block', args.block_size)):
+            node = new_node(block_size)
+            start = perf_counter()
+            feed(node, args.transactions)
+            results.append((name, len(node.chain), perf_counter() - start))
+
+    print(f"{'':<30} {'blocks':>8} {'seconds':>8}")
+    for name, blocks, seconds in results:
+        print(f"{name:<30} {blocks:>8} {seconds:>8.2f}")
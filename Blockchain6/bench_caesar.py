@@ -0,0 +1,45 @@
+from argparse import ArgumentParser
+from time import perf_counter
+
+from BLOCKCHAIN6 import CAESAR_KEY, Transaction, caesar, encrypt_transactions, legacy_caesar
+
+
+# The original encrypt_data loop: one isalpha() check and one string concatenation per character
+def legacy_encrypt(text, key=CAESAR_KEY):
+    encrypted_data = ""
+    for char in text:
+        if char.isalpha():
+            encrypted_data += chr((ord(char) + key - ord('a')) % 26 + ord('a'))
+        else:
+            encrypted_data += char
+    return encrypted_data
+
+
+# Records per second of fn over the records
+def rate(fn, records):
+    start = perf_counter()
+    fn(records)
+    return len(records) / (perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--records', default=100000, type=int, help='shipment records encrypted')
+    args = parser.parse_args()
+
+    transactions = [Transaction(f'Supplier{i % 50}', f'Warehouse{i % 20}', f'Product{i % 1000}', i,
+                                'Historic shipment, back-filled from the ERP export') for i in range(args.records)]
+    records = [t.field_string() for t in transactions]
+
+    if [legacy_caesar.encrypt(r) for r in records[:1000]] != [legacy_encrypt(r) for r in records[:1000]]:
+        raise AssertionError('compat mode differs from the original cipher')
+
+    print(f"{'':<34} {'records/s':>12}")
+    for name, fn in (
+            ('original loop', lambda rs: [legacy_encrypt(r) for r in rs]),
+            ('translate, compat, per record', lambda rs: [legacy_caesar.encrypt(r) for r in rs]),
+            ('translate, per record', lambda rs: [caesar.encrypt(r) for r in rs]),
+            ('translate, bulk', caesar.encrypt_many),
+            ('translate, bulk bytes', lambda rs: caesar.encrypt_many(r.encode() for r in rs)),
+            ('encrypt_transactions, compat', lambda rs: encrypt_transactions(transactions, compat=True))):
+        print(f"{name:<34} {rate(fn, records):>12.0f}")
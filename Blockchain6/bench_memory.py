@@ -0,0 +1,85 @@
+import gc
+import tracemalloc
+from argparse import ArgumentParser
+
+from BLOCKCHAIN6 import Block, Participant, Transaction
+
+
+# The record types as they were before __slots__: attributes in a per-object __dict__ and hashes as hex strings
+class DictRecord:
+    pass
+
+
+# Copy of a hex hash as a new string object, so every record pays for its own hash as it would in a real chain
+def new_hex(digest):
+    return digest.hex()
+
+
+# Copy transactions and blocks into the old layout and into the slotted types; both get their own hash objects
+# and share every other field value
+def dict_transaction(t):
+    record = DictRecord()
+    record.timestamp, record.sender, record.receiver = t.timestamp, t.sender, t.receiver
+    record.product, record.quantity, record.description = t.product, t.quantity, t.description
+    record.hash = new_hex(t.digest)
+    return record
+
+
+def slot_transaction(t):
+    record = Transaction.__new__(Transaction)
+    record.timestamp, record.sender, record.receiver = t.timestamp, t.sender, t.receiver
+    record.product, record.quantity, record.description = t.product, t.quantity, t.description
+    record.digest = bytes.fromhex(new_hex(t.digest))
+    record.encrypted_fields = None
+    return record
+
+
+def dict_participant(participant_id):
+    record = DictRecord()
+    record.participant_id, record.public_key = participant_id, 'KEY'
+    return record
+
+
+def copy_block(record, b):
+    record.timestamp, record.previous_hash, record.transactions = b.timestamp, b.previous_hash, b.transactions
+    record.merkle_root = new_hex(bytes.fromhex(b.merkle_root))
+    record.hash = new_hex(bytes.fromhex(b.hash))
+    return record
+
+
+# Bytes allocated by build() per record it creates, not counting the field values shared with the input
+def bytes_per_record(build, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del records
+    return used / count
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--transactions', default=1000000, type=int, help='transactions held in memory')
+    parser.add_argument('-b', '--block-size', default=500, type=int, help='transactions per block')
+    args = parser.parse_args()
+
+    # Field values are created once and shared by both layouts, so only the records themselves are measured
+    transactions = [Transaction(f'Supplier{i % 50}', f'Warehouse{i % 20}', f'Product{i % 1000}', i, 'Shipment')
+                    for i in range(args.transactions)]
+    groups = [transactions[i:i + args.block_size] for i in range(0, len(transactions), args.block_size)]
+    blocks = [Block('0' * 64, group) for group in groups]
+    rows = [
+        ('transaction', bytes_per_record(lambda: [dict_transaction(t) for t in transactions], len(transactions)),
+         bytes_per_record(lambda: [slot_transaction(t) for t in transactions], len(transactions))),
+        ('block (excluding transactions)',
+         bytes_per_record(lambda: [copy_block(DictRecord(), b) for b in blocks], len(blocks)),
+         bytes_per_record(lambda: [copy_block(Block.__new__(Block), b) for b in blocks], len(blocks))),
+        ('participant', bytes_per_record(lambda: [dict_participant(i) for i in range(100000)], 100000),
+         bytes_per_record(lambda: [Participant(i, 'KEY') for i in range(100000)], 100000)),
+    ]
+
+    print(f"{'bytes per':<32} {'__dict__':>9} {'__slots__':>10}")
+    for name, before, after in rows:
+        print(f"{name:<32} {before:>9.0f} {after:>10.0f}")
@@ -0,0 +1,69 @@
+import contextlib
+import os
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+from BLOCKCHAIN6 import Participant, SupplyChainNode
+
+
+# Build a node holding n sealed shipment events between a few participants over many products
+def build_node(n, products, participants, block_size):
+    node = SupplyChainNode('Node1', 'ADMIN_KEY', block_size=block_size, block_interval=3600)
+    names = [f'Participant{i}' for i in range(participants)]
+    rng = random.Random(0)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name in names:
+            node.add_participant(Participant(name, name + '_KEY'))
+        for i in range(n):
+            sender, receiver = rng.sample(names, 2)
+            node.add_transaction(sender, receiver, f'Product{rng.randrange(products)}', rng.randint(1, 100))
+        node.flush()
+    return node
+
+
+# The only way to answer the query before the indexes: walk every transaction of the chain
+def scan_trace(node, product, start=None, end=None):
+    return [t for block in node.chain for t in block.transactions
+            if t.product == product and (start is None or t.timestamp >= start) and (end is None or t.timestamp <= end)]
+
+
+# Average seconds per call of fn over the arguments
+def time_per_call(fn, arguments):
+    start = perf_counter()
+    for argument in arguments:
+        fn(*argument)
+    return (perf_counter() - start) / len(arguments)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--transactions', default=1000000, type=int, help='sealed transactions in the chain')
+    parser.add_argument('--products', default=100000, type=int, help='number of distinct products')
+    parser.add_argument('--participants', default=50, type=int, help='number of participants')
+    parser.add_argument('-q', '--queries', default=1000, type=int, help='indexed queries timed')
+    args = parser.parse_args()
+
+    start = perf_counter()
+    node = build_node(args.transactions, args.products, args.participants, block_size=500)
+    print(f"built {args.transactions} transactions in {len(node.chain)} blocks in {perf_counter() - start:.1f}s")
+
+    all_transactions = node.find_transactions()
+    first, last = all_transactions[0].timestamp, all_transactions[-1].timestamp
+    window = (first + (last - first) * 0.4, first + (last - first) * 0.5)
+    products = [(f'Product{random.randrange(args.products)}',) for _ in range(args.queries)]
+    windowed = [(product, *window) for (product,) in products]
+
+    if node.trace(*windowed[0]) != scan_trace(node, *windowed[0]):
+        raise AssertionError('indexed trace differs from the scan')
+
+    scan = time_per_call(lambda *query: scan_trace(node, *query), products[:3])
+    trace = time_per_call(node.trace, products)
+    trace_window = time_per_call(node.trace, windowed)
+    sender_window = time_per_call(lambda *window: node.find_transactions(sender='Participant0', start=window[0],
+                                                                            end=window[0] + 0.001), [window] * 100)
+
+    print(f"trace by full scan:        {scan * 1e3:10.3f} ms")
+    print(f"trace(product):            {trace * 1e3:10.3f} ms")
+    print(f"trace(product, window):    {trace_window * 1e3:10.3f} ms")
+    print(f"sender, 1 ms window:       {sender_window * 1e3:10.3f} ms")
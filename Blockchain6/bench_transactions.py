@@ -0,0 +1,49 @@
+import hashlib
+from argparse import ArgumentParser
+from time import perf_counter
+
+from cryptography.fernet import Fernet
+
+from BLOCKCHAIN6 import ParticipantKeyring, Transaction
+
+
+# The original Transaction.calculate_hash: a new Fernet key and cipher for every transaction, then the hash of
+# the (random) ciphertext
+def legacy_calculate_hash(transaction):
+    key = Fernet.generate_key()
+    cipher_suite = Fernet(key)
+
+    encrypted_data = cipher_suite.encrypt(str(transaction.sender).encode() +
+                                          str(transaction.receiver).encode() +
+                                          str(transaction.product).encode() +
+                                          str(transaction.quantity).encode() +
+                                          str(transaction.description).encode())
+
+    return hashlib.sha256(encrypted_data).hexdigest()
+
+
+# Transactions per second of fn over the transactions
+def rate(fn, transactions):
+    start = perf_counter()
+    for transaction in transactions:
+        fn(transaction)
+    return len(transactions) / (perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--transactions', default=20000, type=int, help='transactions hashed per run')
+    parser.add_argument('-p', '--participants', default=10, type=int, help='number of distinct senders')
+    args = parser.parse_args()
+
+    transactions = [Transaction(f'Supplier{i % args.participants}', f'Manufacturer{i % 7}', f'Product{i % 100}',
+                                i, 'Shipment') for i in range(args.transactions)]
+    keyring = ParticipantKeyring()
+
+    print(f"{'':<38} {'tx/s':>10}")
+    for name, fn in (
+            ('before: Fernet key per tx + hash', legacy_calculate_hash),
+            ('after: canonical hash', Transaction.calculate_hash),
+            ('after: re-verify stored hash', Transaction.verify_hash),
+            ('after: hash + encrypt (shared cipher)', lambda t: (t.calculate_hash(), t.encrypt_fields(keyring)))):
+        print(f"{name:<38} {rate(fn, transactions):>10.0f}")